@@ -10,6 +10,7 @@ import io
 import asyncio
 import time
 import platform
+from collections import OrderedDict
 from browser_use.agent.prompts import SystemPrompt, AgentMessagePrompt
 from browser_use.agent.service import Agent
 from browser_use.agent.message_manager.utils import convert_input_messages, extract_json_from_model_output, \
@@ -26,7 +27,6 @@ from browser_use.agent.views import (
     StepMetadata,
     ToolCallingMethod,
 )
-from browser_use.agent.gif import create_history_gif
 from browser_use.browser.browser import Browser
 from browser_use.browser.context import BrowserContext
 from browser_use.browser.views import BrowserStateHistory
@@ -41,21 +41,46 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import (
     BaseMessage,
     HumanMessage,
-    AIMessage
+    AIMessage,
+    SystemMessage
 )
 from browser_use.browser.views import BrowserState, BrowserStateHistory
 from browser_use.agent.prompts import PlannerPrompt
 
-from json_repair import repair_json
-from src.utils.agent_state import AgentState
+from pydantic import ValidationError
+from langchain_anthropic import ChatAnthropic
+from src.utils.agent_state import AgentControl, AgentState
+
+from src.utils.output_parser import StreamingActionParser, parse_model_json, parse_tier_hits
+from src.utils.trajectory_cache import TrajectoryCache
+from src.utils.retry_scheduler import RetryScheduler
+from src.utils.step_profiler import StepProfiler, write_chrome_trace, write_timings_jsonl
+from src.utils.gif_renderer import GifRenderer
+from src.utils.history_writer import HistoryWriter
+from src.utils.agent_checkpoint import AgentCheckpointer, load_checkpoint
+from src.utils.screenshot_store import ScreenshotStore, SpilledBrowserStateHistory
+from src.utils.compact_dom import compact_elements_legend
+from src.utils.adaptive_vision import VisionTrigger, with_request_screenshot
 
 from .custom_message_manager import CustomMessageManager, CustomMessageManagerSettings
-from .custom_views import CustomAgentOutput, CustomAgentStepInfo, CustomAgentState
+from .custom_views import CustomAgentOutput, CustomAgentStepInfo, CustomAgentState, CustomStepMetadata
 
 logger = logging.getLogger(__name__)
 
 Context = TypeVar('Context')
 
+# ActionModel / AgentOutput classes generated per registry action set, building them with pydantic is slow
+_action_models_cache: OrderedDict = OrderedDict()
+_ACTION_MODELS_CACHE_SIZE = 32
+
+
+class StreamedActionsError(ValueError):
+    """The streamed response could not be parsed, but the actions dispatched while streaming already ran"""
+
+    def __init__(self, message: str, results: list[ActionResult]):
+        super().__init__(message)
+        self.results = results
+
 
 class CustomAgent(Agent):
     def __init__(
@@ -108,7 +133,59 @@ class CustomAgent(Agent):
             # Inject state
             injected_agent_state: Optional[AgentState] = None,
             context: Context | None = None,
+            # Stop / pause / resume channel, e.g. the AgentState shared by the webui and deep research
+            agent_state: Optional[AgentControl] = None,
+            # Stream the LLM response and execute actions as soon as they are parsed
+            stream_actions: bool = False,
+            # Only send the interactive elements that changed since the last full listing
+            use_dom_diff: bool = False,
+            dom_diff_resync_interval: int = 10,
+            # Screenshot downscaling, re-encoding and deduplication for vision models
+            screenshot_max_edge: Optional[int] = None,
+            screenshot_format: str = 'png',
+            screenshot_quality: int = 75,
+            dedupe_screenshots: bool = False,
+            # Keep screenshots only in the last K state messages of the history
+            keep_last_images: Optional[int] = None,
+            # Cheap LLM that folds messages cut from history into a rolling summary between steps
+            compaction_llm: Optional[BaseChatModel] = None,
+            # Let providers cache the system and context messages, applied for Anthropic models
+            cache_prompt_prefix: bool = True,
+            # Replay successful trajectories cached for the same task and start url instead of calling the LLM
+            trajectory_cache_dir: Optional[str] = None,
+            # Write the per-phase step timings at the end of the run, as jsonl or chrome trace events
+            step_timings_path: Optional[str] = None,
+            step_timings_format: str = 'jsonl',
+            # Run the planner alongside the action model, its plan is attached to the next state message
+            pipeline_planner: bool = False,
+            # Decides the wait before retrying a failed step, share one between agents using the same provider
+            retry_scheduler: Optional[RetryScheduler] = None,
+            # Token budget of the memory sent in each state message, None sends all of it
+            memory_max_tokens: Optional[int] = 2000,
+            # Write extracted pages larger than extracted_page_spill_size characters to this directory
+            extracted_pages_dir: Optional[str] = None,
+            extracted_page_spill_size: int = 100_000,
+            # Longest edge of the GIF frames, rendered in a worker process while the agent runs
+            gif_frame_max_edge: Optional[int] = None,
+            # Append the conversation and history to <dir>/<agent_id>.jsonl.gz, screenshots go to <dir>/blobs
+            history_stream_dir: Optional[str] = None,
+            # Append the state changes of every step to <dir>/<agent_id>.jsonl, resume with from_checkpoint()
+            checkpoint_dir: Optional[str] = None,
+            # Keep the history screenshots in files under this directory instead of in memory
+            screenshot_store_dir: Optional[str] = None,
+            # Send only the K interactive elements most relevant to the task, goal and memory
+            rank_elements_top_k: Optional[int] = None,
+            # List the interactive elements with short attribute keys declared once in the system prompt
+            compact_elements: bool = False,
+            # With use_vision, only send the screenshot on a new url, after an error, on canvas or iframe
+            # pages, or when the model asks for it with the request_screenshot action
+            adaptive_vision: bool = False,
     ):
+        # without vision there is no screenshot to ask for
+        adaptive_vision = adaptive_vision and use_vision
+        if adaptive_vision:
+            controller = with_request_screenshot(controller)
+
         super(CustomAgent, self).__init__(
             task=task,
             llm=llm,
@@ -143,23 +220,104 @@ class CustomAgent(Agent):
         )
         self.state = injected_agent_state or CustomAgentState()
         self.add_infos = add_infos
+        self.agent_state = agent_state or AgentControl()
+        self.stream_actions = stream_actions
+        self.compaction_llm = compaction_llm
+        self._compaction_task: Optional[asyncio.Task] = None
+        self.trajectory_cache = TrajectoryCache(trajectory_cache_dir) if trajectory_cache_dir else None
+        self.step_timings_path = step_timings_path
+        self.step_timings_format = step_timings_format
+        self.pipeline_planner = pipeline_planner
+        self._planner_task: Optional[asyncio.Task] = None
+        self._planner_url: Optional[str] = None
+        self.retry_scheduler = retry_scheduler or RetryScheduler(rate_limit_delay=retry_delay)
+        self.memory_max_tokens = memory_max_tokens
+        if extracted_pages_dir:
+            self.state.extracted_pages.spill_dir = extracted_pages_dir
+            self.state.extracted_pages.spill_size = extracted_page_spill_size
+        self.gif_frame_max_edge = gif_frame_max_edge
+        self.vision_trigger = VisionTrigger() if adaptive_vision else None
+        self.screenshot_store = ScreenshotStore(screenshot_store_dir) if screenshot_store_dir else None
+        if self.screenshot_store:
+            for item in self.state.history.history:
+                item.state = SpilledBrowserStateHistory.spill(item.state, self.screenshot_store)
+        self._gif_renderer: Optional[GifRenderer] = None
+        # Resolves to the GIF path once the background render started at the end of run() is done
+        self.gif_task: Optional[asyncio.Task] = None
+        self.history_writer: Optional[HistoryWriter] = None
+        self._history_items_streamed = 0
+        if history_stream_dir:
+            self.history_writer = HistoryWriter(os.path.join(history_stream_dir, f"{self.state.agent_id}.jsonl.gz"))
+            if os.path.exists(self.history_writer.path):
+                # resumed run, the injected history is already in the stream
+                self._history_items_streamed = len(self.state.history.history)
+        self.checkpointer: Optional[AgentCheckpointer] = None
+        if checkpoint_dir:
+            self.checkpointer = AgentCheckpointer(checkpoint_dir, self.state.agent_id)
+            if os.path.exists(self.checkpointer.path):
+                self.checkpointer.mark_saved(self.state)
+        system_message = self.settings.system_prompt_class(
+            self.available_actions,
+            max_actions_per_step=self.settings.max_actions_per_step,
+        ).get_system_message()
+        if compact_elements:
+            system_message = SystemMessage(
+                content=f'{system_message.content}\n{compact_elements_legend(self.settings.include_attributes)}')
         self._message_manager = CustomMessageManager(
             task=task,
-            system_message=self.settings.system_prompt_class(
-                self.available_actions,
-                max_actions_per_step=self.settings.max_actions_per_step,
-            ).get_system_message(),
+            system_message=system_message,
             settings=CustomMessageManagerSettings(
                 max_input_tokens=self.settings.max_input_tokens,
                 include_attributes=self.settings.include_attributes,
                 message_context=self.settings.message_context,
                 sensitive_data=sensitive_data,
                 available_file_paths=self.settings.available_file_paths,
-                agent_prompt_class=agent_prompt_class
+                agent_prompt_class=agent_prompt_class,
+                use_dom_diff=use_dom_diff,
+                dom_diff_resync_interval=dom_diff_resync_interval,
+                screenshot_max_edge=screenshot_max_edge,
+                screenshot_format=screenshot_format,
+                screenshot_quality=screenshot_quality,
+                dedupe_screenshots=dedupe_screenshots,
+                keep_last_images=keep_last_images,
+                compact_history=compaction_llm is not None,
+                cache_prompt_prefix=cache_prompt_prefix and isinstance(llm, ChatAnthropic),
+                rank_elements_top_k=rank_elements_top_k,
+                compact_elements=compact_elements,
             ),
             state=self.state.message_manager_state,
         )
 
+    @classmethod
+    def from_checkpoint(
+            cls,
+            checkpoint_path: str,
+            controller: Controller[Context] = Controller(),
+            **kwargs,
+    ) -> 'CustomAgent':
+        """
+        Agent continuing the run saved in checkpoint_path, run() picks up after the last completed step.
+        Unless initial_actions are given, the browser is first sent back to the url of the last step.
+        """
+        output_model = CustomAgentOutput.type_with_custom_actions(controller.registry.create_action_model())
+        state = load_checkpoint(checkpoint_path, output_model)
+        urls = [url for url in state.history.urls() if url]
+        if urls and "initial_actions" not in kwargs:
+            kwargs["initial_actions"] = [{"go_to_url": {"url": urls[-1]}}]
+        logger.info(f"📂 Resuming agent {state.agent_id} at step {state.n_steps} from {checkpoint_path}")
+        return cls(
+            controller=controller,
+            injected_agent_state=state,
+            checkpoint_dir=os.path.dirname(checkpoint_path),
+            **kwargs,
+        )
+
+    async def _save_checkpoint(self) -> None:
+        try:
+            await self.checkpointer.save(self.state)
+        except Exception as e:
+            logger.error(f"Failed to checkpoint agent state to {self.checkpointer.path}: {e}")
+
     def _log_response(self, response: CustomAgentOutput) -> None:
         """Log the model's response"""
         if "Success" in response.current_state.evaluation_previous_goal:
@@ -179,11 +337,23 @@ class CustomAgent(Agent):
             )
 
     def _setup_action_models(self) -> None:
-        """Setup dynamic action models from controller's registry"""
-        # Get the dynamic action model from controller's registry
-        self.ActionModel = self.controller.registry.create_action_model()
-        # Create output model with the dynamic actions
-        self.AgentOutput = CustomAgentOutput.type_with_custom_actions(self.ActionModel)
+        """Setup dynamic action models from controller's registry, reusing the ones built for the same actions"""
+        signature = tuple(
+            (name, action.description, action.param_model)
+            for name, action in self.controller.registry.registry.actions.items()
+        )
+        models = _action_models_cache.get(signature)
+        if models is None:
+            # Get the dynamic action model from controller's registry
+            action_model = self.controller.registry.create_action_model()
+            # Create output model with the dynamic actions
+            models = (action_model, CustomAgentOutput.type_with_custom_actions(action_model))
+            _action_models_cache[signature] = models
+            if len(_action_models_cache) > _ACTION_MODELS_CACHE_SIZE:
+                _action_models_cache.popitem(last=False)
+        else:
+            _action_models_cache.move_to_end(signature)
+        self.ActionModel, self.AgentOutput = models
 
     def update_step_info(
             self, model_output: CustomAgentOutput, step_info: CustomAgentStepInfo = None
@@ -195,21 +365,98 @@ class CustomAgent(Agent):
             return
 
         step_info.step_number += 1
+        step_info.next_goal = model_output.current_state.next_goal
         important_contents = model_output.current_state.important_contents
-        if (
-                important_contents
-                and "None" not in important_contents
-                and important_contents not in step_info.memory
-        ):
-            step_info.memory += important_contents + "\n"
+        if important_contents and "None" not in important_contents:
+            step_info.memory_store.add(important_contents, step_info.step_number)
+        step_info.memory = step_info.memory_store.render(
+            query=f"{step_info.task} {model_output.current_state.next_goal}",
+            max_tokens=self.memory_max_tokens,
+        )
 
         logger.info(f"🧠 All Memory: \n{step_info.memory}")
 
+    async def _handle_step_error(self, error: Exception) -> list[ActionResult]:
+        """Handle all types of errors that can occur during a step, waiting as long as the error type requires"""
+        include_trace = logger.isEnabledFor(logging.DEBUG)
+        error_msg = AgentError.format_error(error, include_trace=include_trace)
+        prefix = f'❌ Result failed {self.state.consecutive_failures + 1}/{self.settings.max_failures} times:\n '
+
+        if isinstance(error, (ValidationError, ValueError)):
+            logger.error(f'{prefix}{error_msg}')
+            if 'Max token limit reached' in error_msg:
+                # cut tokens from history
+                self._message_manager.settings.max_input_tokens = self.settings.max_input_tokens - 500
+                logger.info(
+                    f'Cutting tokens from history - new max input tokens: {self._message_manager.settings.max_input_tokens}'
+                )
+                self._message_manager.cut_messages()
+            elif 'Could not parse response' in error_msg:
+                # give model a hint how output should look like
+                error_msg += '\n\nReturn a valid JSON object with the required fields.'
+        else:
+            logger.warning(f'{prefix}{error_msg}')
+            try:
+                await self._await_interruptible(
+                    self.retry_scheduler.wait_before_retry(error, self.state.consecutive_failures))
+            except InterruptedError:
+                # a stop or pause ends the backoff, the error is still recorded for the step
+                pass
+
+        self.state.consecutive_failures += 1
+        return [ActionResult(error=error_msg, include_in_memory=True)]
+
+    async def _raise_if_stopped_or_paused(self) -> None:
+        """Also treat a stop or pause requested through the agent_state channel as an interruption"""
+        if self.agent_state.is_stop_requested() or self.agent_state.is_paused():
+            raise InterruptedError
+        await super()._raise_if_stopped_or_paused()
+
+    async def _await_interruptible(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        Await an LLM call or browser action without blocking the event loop.
+        It is cancelled as soon as a stop or pause is requested through the agent_state channel.
+        """
+        work_task = asyncio.ensure_future(awaitable)
+        interrupt_task = asyncio.ensure_future(self.agent_state.wait_for_interrupt())
+        try:
+            await asyncio.wait({work_task, interrupt_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            interrupt_task.cancel()
+            interrupted = not work_task.done()
+            if interrupted:
+                work_task.cancel()
+
+        if interrupted:
+            logger.info("🛑 Interrupted by stop or pause request")
+            raise InterruptedError
+        return work_task.result()
+
+    def pause(self) -> None:
+        """Pause the agent, interrupting the running LLM call or action"""
+        super().pause()
+        self.agent_state.request_pause()
+
+    def resume(self) -> None:
+        """Resume the agent"""
+        super().resume()
+        self.agent_state.resume()
+
+    def stop(self) -> None:
+        """Stop the agent, interrupting the running LLM call or action"""
+        super().stop()
+        self.agent_state.request_stop()
+
     @time_execution_async("--get_next_action")
     async def get_next_action(self, input_messages: list[BaseMessage]) -> AgentOutput:
         """Get next action from LLM based on current state"""
         fixed_input_messages = self._convert_input_messages(input_messages)
-        ai_message = self.llm.invoke(fixed_input_messages)
+        await self._await_interruptible(self.retry_scheduler.wait_if_throttled())
+        ai_message = await self._await_interruptible(self.llm.ainvoke(fixed_input_messages))
+        return self._parse_model_output(ai_message)
+
+    def _parse_model_output(self, ai_message: BaseMessage) -> AgentOutput:
+        """Record the raw LLM message and parse it into the agent output model"""
         self.message_manager._add_message_with_tokens(ai_message)
 
         if hasattr(ai_message, "reasoning_content"):
@@ -223,9 +470,7 @@ class CustomAgent(Agent):
             ai_content = ai_message.content
 
         try:
-            ai_content = ai_content.replace("```json", "").replace("```", "")
-            ai_content = repair_json(ai_content)
-            parsed_json = json.loads(ai_content)
+            parsed_json = parse_model_json(ai_content)
             parsed: AgentOutput = self.AgentOutput(**parsed_json)
         except Exception as e:
             import traceback
@@ -243,16 +488,131 @@ class CustomAgent(Agent):
         self._log_response(parsed)
         return parsed
 
+    @time_execution_async("--get_next_action_streaming")
+    async def get_next_action_streaming(
+            self, input_messages: list[BaseMessage]
+    ) -> tuple[AgentOutput, list[ActionResult]]:
+        """
+        Stream the LLM response and dispatch every action to the controller as soon as it is complete,
+        while the model is still generating the following ones.
+        """
+        fixed_input_messages = self._convert_input_messages(input_messages)
+        await self._await_interruptible(self.retry_scheduler.wait_if_throttled())
+        parser = StreamingActionParser()
+        action_queue: asyncio.Queue = asyncio.Queue()
+        executor = asyncio.ensure_future(self._multi_act_from_queue(action_queue))
+
+        async def consume_stream() -> BaseMessage:
+            ai_message = None
+            n_dispatched = 0
+            async for chunk in self.llm.astream(fixed_input_messages):
+                ai_message = chunk if ai_message is None else ai_message + chunk
+                for action in parser.feed(self._message_text(chunk)):
+                    if n_dispatched < self.settings.max_actions_per_step:
+                        action_queue.put_nowait(action)
+                        n_dispatched += 1
+            return ai_message
+
+        try:
+            ai_message = await self._await_interruptible(consume_stream())
+        except BaseException:
+            executor.cancel()
+            raise
+        finally:
+            action_queue.put_nowait(None)
+
+        if ai_message is None:
+            executor.cancel()
+            raise ValueError('Could not parse response.')
+        try:
+            parsed = self._parse_model_output(ai_message)
+        except Exception as e:
+            # the actions dispatched so far changed the page, keep what they returned
+            result = await self._await_interruptible(executor)
+            if not result:
+                raise
+            raise StreamedActionsError(str(e), result) from e
+        result = await self._await_interruptible(executor)
+        logger.debug(f"Dispatched {len(result)}/{len(parsed.action)} actions while streaming")
+        return parsed, result
+
+    @staticmethod
+    def _message_text(message: BaseMessage) -> str:
+        """Text content of a message or message chunk"""
+        if isinstance(message.content, str):
+            return message.content
+        return "".join(
+            item.get("text", "") if isinstance(item, dict) else str(item) for item in message.content
+        )
+
+    async def _multi_act_from_queue(self, action_queue: asyncio.Queue) -> list[ActionResult]:
+        """Execute actions as the streaming parser emits them, with the same checks as multi_act"""
+        results = []
+
+        cached_selector_map = await self.browser_context.get_selector_map()
+        cached_path_hashes = set(e.hash.branch_path_hash for e in cached_selector_map.values())
+
+        await self.browser_context.remove_highlights()
+
+        i = 0
+        while True:
+            action_dict = await action_queue.get()
+            if action_dict is None:
+                break
+            try:
+                action = self.ActionModel(**action_dict)
+            except Exception as e:
+                logger.debug(f"Stop dispatching, invalid streamed action {action_dict}: {e}")
+                break
+
+            if i != 0:
+                await asyncio.sleep(self.browser_context.config.wait_between_actions)
+                if action.get_index() is not None:
+                    new_state = await self.browser_context.get_state()
+                    new_path_hashes = set(e.hash.branch_path_hash for e in new_state.selector_map.values())
+                    if not new_path_hashes.issubset(cached_path_hashes):
+                        # next action requires index but there are new elements on the page
+                        msg = f'Something new appeared after action {i}'
+                        logger.info(msg)
+                        results.append(ActionResult(extracted_content=msg, include_in_memory=True))
+                        break
+
+            await self._raise_if_stopped_or_paused()
+
+            result = await self.controller.act(
+                action,
+                self.browser_context,
+                self.settings.page_extraction_llm,
+                self.sensitive_data,
+                self.settings.available_file_paths,
+                context=self.context,
+            )
+            results.append(result)
+            i += 1
+
+            logger.debug(f'Executed streamed action {i}')
+            if result.is_done or result.error:
+                break
+
+        return results
+
     async def _run_planner(self) -> Optional[str]:
         """Run the planner to analyze state and suggest next steps"""
         # Skip planning if no planner_llm is set
         if not self.settings.planner_llm:
             return None
 
+        # Get planner output
+        response = await self.settings.planner_llm.ainvoke(self._get_planner_messages())
+        return self._attach_plan(response)
+
+    def _get_planner_messages(self) -> list[BaseMessage]:
+        """Planner prompt followed by the message history, ending with the current state message"""
         # Create planner message history using full message history
         planner_messages = [
             PlannerPrompt(self.controller.registry.get_prompt_description()).get_system_message(),
-            *self.message_manager.get_messages()[1:],  # Use full message history except the first
+            # Use full message history except the first
+            *self.message_manager.get_messages(cache_prefix=False)[1:],
         ]
 
         if not self.settings.use_vision_for_planner and self.settings.use_vision:
@@ -270,8 +630,10 @@ class CustomAgent(Agent):
 
             planner_messages[-1] = HumanMessage(content=new_msg)
 
-        # Get planner output
-        response = await self.settings.planner_llm.ainvoke(planner_messages)
+        return planner_messages
+
+    def _attach_plan(self, response: BaseMessage) -> str:
+        """Append the planner output to the current state message"""
         plan = str(response.content)
         last_state_message = self.message_manager.get_messages()[-1]
         if isinstance(last_state_message, HumanMessage):
@@ -299,6 +661,161 @@ class CustomAgent(Agent):
             logger.info(f'📋 Plans: {plan}')
         return plan
 
+    def _start_pipelined_planner(self, url: str) -> None:
+        """Plan in the background while the action model handles the current step"""
+        if self._planner_task and not self._planner_task.done():
+            return
+        self._planner_task = asyncio.create_task(self.settings.planner_llm.ainvoke(self._get_planner_messages()))
+        self._planner_url = url
+
+    def _attach_pipelined_plan(self, state: BrowserState) -> None:
+        """Attach the finished background plan to the current state message, unless the page changed"""
+        planner_task = self._planner_task
+        if planner_task is None or not planner_task.done():
+            return
+        self._planner_task = None
+        if planner_task.cancelled() or planner_task.exception():
+            logger.warning(f'Background planner failed: {None if planner_task.cancelled() else planner_task.exception()}')
+            return
+        if state.url != self._planner_url:
+            logger.debug(f'Dropping plan made for {self._planner_url}, now on {state.url}')
+            return
+        self._attach_plan(planner_task.result())
+
+    def _schedule_history_compaction(self) -> None:
+        """Cut history to the token budget and fold the cut messages into the summary in the background"""
+        if not self.compaction_llm:
+            return
+        self.message_manager.cut_messages()
+        if self._compaction_task and not self._compaction_task.done():
+            # the messages stay set aside until the running compaction is finished
+            return
+        evicted = self.message_manager.pop_evicted_messages()
+        if evicted:
+            self._compaction_task = asyncio.create_task(self._compact_history(evicted))
+
+    async def _compact_history(self, evicted: list[BaseMessage]) -> None:
+        """Fold messages cut from history into the rolling history summary"""
+        transcript = "\n\n".join(
+            f"{message.__class__.__name__}: {self._message_text(message)}" for message in evicted
+        )
+        summary_messages = [
+            SystemMessage(
+                content="You compress the history of a browser automation agent. "
+                        "Merge the previous summary and the new messages into one concise summary of at most "
+                        "300 words. Keep the pages visited, actions taken and their outcomes, extracted facts, "
+                        "values entered and anything still left to do. Answer with the summary only."
+            ),
+            HumanMessage(
+                content=f"Task: {self.task}\n\n"
+                        f"Previous summary:\n{self.message_manager.history_summary or 'None'}\n\n"
+                        f"New messages:\n{transcript}"
+            ),
+        ]
+        try:
+            response = await self.compaction_llm.ainvoke(summary_messages)
+        except Exception as e:
+            logger.warning(f"History compaction failed, {len(evicted)} messages dropped: {e}")
+            return
+        summary = self._message_text(response).split("</think>")[-1].strip()
+        self.message_manager.set_history_summary(summary)
+        logger.debug(f"🗜️ Folded {len(evicted)} messages into the history summary")
+
+    async def _replay_trajectory(self, history: AgentHistoryList, step_info: CustomAgentStepInfo) -> bool:
+        """
+        Replay the actions of a cached trajectory, matching the interacted elements against the live DOM.
+        Returns True if the task was completed, False as soon as the page diverges from the trajectory.
+        """
+        logger.info(f"♻️ Replaying cached trajectory of {len(history.history)} steps")
+        for history_item in history.history:
+            if not history_item.model_output or not history_item.model_output.action:
+                continue
+            await self._raise_if_stopped_or_paused()
+
+            step_start_time = time.time()
+            state = await self.browser_context.get_state()
+            interacted_elements = history_item.state.interacted_element or []
+            actions = []
+            for i, action in enumerate(history_item.model_output.action):
+                historical_element = interacted_elements[i] if i < len(interacted_elements) else None
+                updated_action = await self._update_action_indices(historical_element, action, state)
+                if updated_action is None:
+                    logger.info(f"♻️ Cached element {i} not found on the page, continuing with the LLM")
+                    return False
+                actions.append(updated_action)
+
+            result = await self._await_interruptible(self.multi_act(actions))
+            self._record_extracted_pages(result)
+            self.state.last_result = result
+            self.state.last_action = actions
+            self.state.n_steps += 1
+            # the LLM picks up from the replayed steps if the page diverges later on
+            self.update_step_info(history_item.model_output, step_info)
+            self.message_manager._add_message_with_tokens(
+                AIMessage(content=history_item.model_output.model_dump_json(exclude_unset=True)))
+            self._make_history_item(
+                history_item.model_output,
+                state,
+                result,
+                StepMetadata(
+                    step_number=self.state.n_steps,
+                    step_start_time=step_start_time,
+                    step_end_time=time.time(),
+                    input_tokens=0,
+                ),
+            )
+
+            if result and result[-1].is_done:
+                if self.state.extracted_pages:
+                    result[-1].extracted_content = self.state.extracted_pages.render()
+                logger.info(f"📄 Result: {result[-1].extracted_content}")
+                return True
+            if len(result) < len(actions) or any(r.error for r in result):
+                logger.info("♻️ The page diverged from the cached trajectory, continuing with the LLM")
+                return False
+        return False
+
+    def _record_extracted_pages(self, result: list[ActionResult]) -> None:
+        """Record every extracted page once"""
+        for ret_ in result:
+            if ret_.extracted_content and "Extracted page" in ret_.extracted_content:
+                self.state.extracted_pages.add(ret_.extracted_content)
+
+    def _make_history_item(
+            self,
+            model_output: AgentOutput | None,
+            state: BrowserState,
+            result: list[ActionResult],
+            metadata: Optional[StepMetadata] = None,
+    ) -> None:
+        super()._make_history_item(model_output, state, result, metadata)
+        if self.screenshot_store:
+            item = self.state.history.history[-1]
+            item.state = SpilledBrowserStateHistory.spill(item.state, self.screenshot_store)
+        if self._gif_renderer:
+            self._render_gif_frame(self.state.history.history[-1])
+        if self.history_writer:
+            # the last item can still be updated at the end of the run
+            self._stream_history_items(len(self.state.history.history) - 1)
+
+    def _stream_history_items(self, end: int) -> None:
+        for item in self.state.history.history[self._history_items_streamed:end]:
+            self.history_writer.write_history_item(item)
+        self._history_items_streamed = max(self._history_items_streamed, end)
+
+    def _render_gif_frame(self, item: AgentHistory) -> None:
+        goal = item.model_output.current_state.next_goal if item.model_output else None
+        self._gif_renderer.add_step(item.state.screenshot, goal)
+
+    def _use_vision_for_step(self, state: BrowserState) -> bool:
+        if not self.settings.use_vision or not self.vision_trigger:
+            return self.settings.use_vision
+        reason = self.vision_trigger.reason(state.url, state.element_tree, self.state.last_result,
+                                            self.state.last_action)
+        if reason:
+            logger.info(f"📷 Sending screenshot: {reason}")
+        return reason is not None
+
     @time_execution_async("--step")
     async def step(self, step_info: Optional[CustomAgentStepInfo] = None) -> None:
         """Execute one step of the task"""
@@ -308,32 +825,51 @@ class CustomAgent(Agent):
         result: list[ActionResult] = []
         step_start_time = time.time()
         tokens = 0
+        profiler = StepProfiler()
 
         try:
-            state = await self.browser_context.get_state()
+            with profiler.phase("get_state"):
+                state = await self._await_interruptible(self.browser_context.get_state())
             await self._raise_if_stopped_or_paused()
 
-            self.message_manager.add_state_message(state, self.state.last_action, self.state.last_result, step_info,
-                                                   self.settings.use_vision)
+            with profiler.phase("state_message"):
+                await self.message_manager.add_state_message_async(
+                    state, self.state.last_action, self.state.last_result, step_info,
+                    self._use_vision_for_step(state))
 
             # Run planner at specified intervals if planner is configured
-            if self.settings.planner_llm and self.state.n_steps % self.settings.planner_interval == 0:
-                await self._run_planner()
+            if self.settings.planner_llm and self.pipeline_planner:
+                # the plan made during the previous step is used now, the next one runs alongside the llm call
+                self._attach_pipelined_plan(state)
+                if self.state.n_steps % self.settings.planner_interval == 0:
+                    self._start_pipelined_planner(state.url)
+            elif self.settings.planner_llm and self.state.n_steps % self.settings.planner_interval == 0:
+                with profiler.phase("planner"):
+                    await self._run_planner()
             input_messages = self.message_manager.get_messages()
             tokens = self._message_manager.state.history.current_tokens
 
             try:
-                model_output = await self.get_next_action(input_messages)
+                if self.stream_actions:
+                    with profiler.phase("llm_and_actions"):
+                        model_output, result = await self.get_next_action_streaming(input_messages)
+                else:
+                    with profiler.phase("llm"):
+                        model_output = await self.get_next_action(input_messages)
                 self.update_step_info(model_output, step_info)
                 self.state.n_steps += 1
 
                 if self.register_new_step_callback:
                     await self.register_new_step_callback(state, model_output, self.state.n_steps)
 
-                if self.settings.save_conversation_path:
-                    target = self.settings.save_conversation_path + f'_{self.state.n_steps}.txt'
-                    save_conversation(input_messages, model_output, target,
-                                      self.settings.save_conversation_path_encoding)
+                if self.settings.save_conversation_path and self.history_writer:
+                    # goes to the history stream instead of one text file per step
+                    self.history_writer.write_conversation(self.state.n_steps, input_messages, model_output)
+                elif self.settings.save_conversation_path:
+                    with profiler.phase("save_conversation"):
+                        target = self.settings.save_conversation_path + f'_{self.state.n_steps}.txt'
+                        save_conversation(input_messages, model_output, target,
+                                          self.settings.save_conversation_path_encoding)
 
                 if self.model_name != "deepseek-reasoner":
                     # remove prev message
@@ -344,18 +880,17 @@ class CustomAgent(Agent):
                 self.message_manager._remove_state_message_by_index(-1)
                 raise e
 
-            result: list[ActionResult] = await self.multi_act(model_output.action)
-            for ret_ in result:
-                if ret_.extracted_content and "Extracted page" in ret_.extracted_content:
-                    # record every extracted page
-                    if ret_.extracted_content[:100] not in self.state.extracted_content:
-                        self.state.extracted_content += ret_.extracted_content
+            if not self.stream_actions:
+                with profiler.phase("multi_act"):
+                    result = await self._await_interruptible(self.multi_act(model_output.action))
+            self._record_extracted_pages(result)
             self.state.last_result = result
             self.state.last_action = model_output.action
             if len(result) > 0 and result[-1].is_done:
-                if not self.state.extracted_content:
-                    self.state.extracted_content = step_info.memory
-                result[-1].extracted_content = self.state.extracted_content
+                if self.state.extracted_pages:
+                    result[-1].extracted_content = self.state.extracted_pages.render()
+                else:
+                    result[-1].extracted_content = step_info.memory_store.render()
                 logger.info(f"📄 Result: {result[-1].extracted_content}")
 
             self.state.consecutive_failures = 0
@@ -372,6 +907,9 @@ class CustomAgent(Agent):
 
         except Exception as e:
             result = await self._handle_step_error(e)
+            if isinstance(e, StreamedActionsError):
+                self._record_extracted_pages(e.results)
+                result = e.results + result
             self.state.last_result = result
 
         finally:
@@ -390,11 +928,12 @@ class CustomAgent(Agent):
                 return
 
             if state:
-                metadata = StepMetadata(
+                metadata = CustomStepMetadata(
                     step_number=self.state.n_steps,
                     step_start_time=step_start_time,
                     step_end_time=step_end_time,
                     input_tokens=tokens,
+                    phases=profiler.phases,
                 )
                 self._make_history_item(model_output, state, result, metadata)
 
@@ -403,6 +942,14 @@ class CustomAgent(Agent):
         try:
             self._log_agent_run()
 
+            if self.settings.generate_gif:
+                output_path: str = 'agent_history.gif'
+                if isinstance(self.settings.generate_gif, str):
+                    output_path = self.settings.generate_gif
+                self._gif_renderer = GifRenderer(self.task, output_path, frame_max_edge=self.gif_frame_max_edge)
+                for item in self.state.history.history:
+                    self._render_gif_frame(item)
+
             # Execute initial actions if provided
             if self.initial_actions:
                 result = await self.multi_act(self.initial_actions, check_for_new_elements=False)
@@ -411,28 +958,61 @@ class CustomAgent(Agent):
             step_info = CustomAgentStepInfo(
                 task=self.task,
                 add_infos=self.add_infos,
-                step_number=1,
+                step_number=self.state.n_steps,
                 max_steps=max_steps,
                 memory="",
             )
+            # resumed or injected state, rebuild the memory from the steps already taken
+            for item in self.state.history.history:
+                important_contents = getattr(item.model_output.current_state, "important_contents",
+                                             None) if item.model_output else None
+                if important_contents and "None" not in important_contents:
+                    step_info.memory_store.add(important_contents, item.metadata.step_number if item.metadata else 1)
+            if len(step_info.memory_store):
+                step_info.memory = step_info.memory_store.render(query=self.task, max_tokens=self.memory_max_tokens)
+
+            start_url = None
+            if self.trajectory_cache:
+                start_url = (await self.browser_context.get_current_page()).url
+                cached_history = self.trajectory_cache.get(self.task, start_url, self.AgentOutput)
+                replayed = False
+                if cached_history:
+                    try:
+                        replayed = await self._replay_trajectory(cached_history, step_info)
+                    except InterruptedError:
+                        # the loop below ends the run on stop, or waits on pause and continues with the LLM
+                        self.state.last_result = [ActionResult(
+                            error='The agent was paused - now continuing actions might need to be repeated',
+                            include_in_memory=True,
+                        )]
+                    except Exception as e:
+                        logger.warning(f"♻️ Replaying the cached trajectory failed, continuing with the LLM: {e}")
+                if replayed:
+                    await self.log_completion()
+                    return self.state.history
 
-            for step in range(max_steps):
+            for step in range(self.state.n_steps - 1, max_steps):
                 # Check if we should stop due to too many failures
                 if self.state.consecutive_failures >= self.settings.max_failures:
                     logger.error(f'❌ Stopping due to {self.settings.max_failures} consecutive failures')
                     break
 
                 # Check control flags before each step
-                if self.state.stopped:
+                if self.state.stopped or self.agent_state.is_stop_requested():
                     logger.info('Agent stopped')
                     break
 
-                while self.state.paused:
-                    await asyncio.sleep(0.2)  # Small delay to prevent CPU spinning
-                    if self.state.stopped:  # Allow stopping while paused
+                if self.state.paused or self.agent_state.is_paused():
+                    # returns on resume, or right away on stop
+                    await self.agent_state.wait_until_resumed()
+                    if self.state.stopped or self.agent_state.is_stop_requested():
+                        logger.info('Agent stopped')
                         break
 
                 await self.step(step_info)
+                self._schedule_history_compaction()
+                if self.checkpointer:
+                    await self._save_checkpoint()
 
                 if self.state.history.is_done():
                     if self.settings.validate_output and step < max_steps - 1:
@@ -443,14 +1023,21 @@ class CustomAgent(Agent):
                     break
             else:
                 logger.info("❌ Failed to complete task in maximum steps")
-                if not self.state.extracted_content:
-                    self.state.history.history[-1].result[-1].extracted_content = step_info.memory
+                if not self.state.extracted_pages:
+                    self.state.history.history[-1].result[-1].extracted_content = step_info.memory_store.render()
                 else:
-                    self.state.history.history[-1].result[-1].extracted_content = self.state.extracted_content
+                    self.state.history.history[-1].result[-1].extracted_content = self.state.extracted_pages.render()
 
+            if self.trajectory_cache:
+                self.trajectory_cache.put(self.task, start_url, self.state.history)
             return self.state.history
 
         finally:
+            for task in (self._compaction_task, self._planner_task):
+                if task and not task.done():
+                    task.cancel()
+            logger.debug(f'Response parser tier hits: {dict(parse_tier_hits)}')
+
             self.telemetry.capture(
                 AgentEndTelemetryEvent(
                     agent_id=self.state.agent_id,
@@ -464,15 +1051,32 @@ class CustomAgent(Agent):
                 )
             )
 
+            if self.checkpointer and self.state.history.is_done():
+                # nothing left to resume
+                try:
+                    self.checkpointer.remove()
+                except OSError as e:
+                    logger.error(f"Failed to remove checkpoint {self.checkpointer.path}: {e}")
+            elif self.checkpointer:
+                await self._save_checkpoint()
+
+            if self.history_writer:
+                self._stream_history_items(len(self.state.history.history))
+                await self.history_writer.close()
+
             if not self.injected_browser_context:
                 await self.browser_context.close()
 
             if not self.injected_browser and self.browser:
                 await self.browser.close()
 
-            if self.settings.generate_gif:
-                output_path: str = 'agent_history.gif'
-                if isinstance(self.settings.generate_gif, str):
-                    output_path = self.settings.generate_gif
+            if self._gif_renderer:
+                # not awaited, the caller gets the history right away and can wait on gif_task
+                self.gif_task = asyncio.ensure_future(self._gif_renderer.finish())
+                self._gif_renderer = None
 
-                create_history_gif(task=self.task, history=self.state.history, output_path=output_path)
+            if self.step_timings_path:
+                if self.step_timings_format == 'chrome':
+                    write_chrome_trace(self.state.history, self.step_timings_path)
+                else:
+                    write_timings_jsonl(self.state.history, self.step_timings_path)
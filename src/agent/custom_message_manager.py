@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import logging
 import pdb
-from typing import List, Optional, Type, Dict
+from typing import List, Literal, Optional, Type, Dict
 
 from browser_use.agent.message_manager.service import MessageManager
 from browser_use.agent.message_manager.views import MessageHistory
@@ -23,13 +25,42 @@ from langchain_core.messages import (
 )
 from langchain_openai import ChatOpenAI
 from ..utils.llm import DeepSeekR1ChatOpenAI
-from .custom_prompts import CustomAgentMessagePrompt
+from ..utils.dom_diff import split_element_entries, diff_element_entries
+from ..utils.screenshot_utils import prepare_screenshot, screenshot_fingerprint, fingerprint_distance
+from ..utils.element_ranking import ElementRanker
+from ..utils.compact_dom import compact_elements_to_string
+from .custom_prompts import CustomAgentMessagePrompt, format_elements_text
+from .custom_views import CustomMessageHistory
 
 logger = logging.getLogger(__name__)
 
+HISTORY_SUMMARY_HEADER = 'Summary of the earlier steps, which were removed from the history:\n'
+DOM_BASE_HEADER = 'Full listing of interactive elements of '
+SCREENSHOT_OMITTED = '[Screenshot omitted: the page looks the same as in the last screenshot you received]'
+
 
 class CustomMessageManagerSettings(MessageManagerSettings):
     agent_prompt_class: Type[AgentMessagePrompt] = AgentMessagePrompt
+    # Send only the changed interactive elements, against a full listing kept in history
+    use_dom_diff: bool = False
+    dom_diff_resync_interval: int = 10
+    # Screenshot preparation before it is sent to the LLM
+    screenshot_max_edge: Optional[int] = None
+    screenshot_format: Literal['png', 'jpeg', 'webp'] = 'png'
+    screenshot_quality: int = 75
+    # Replace the screenshot by a note when the page looks the same as in the last sent one
+    dedupe_screenshots: bool = False
+    screenshot_dedupe_distance: int = 0
+    # Keep images only in the last K state messages of the history, None keeps them all
+    keep_last_images: Optional[int] = None
+    # Set evicted messages aside to be folded into a summary message instead of dropping them
+    compact_history: bool = False
+    # Mark the system and context messages as a cacheable prefix (Anthropic cache_control)
+    cache_prompt_prefix: bool = False
+    # Send only the K interactive elements most relevant to the task, goal and memory, None sends all
+    rank_elements_top_k: Optional[int] = None
+    # List the interactive elements with short attribute keys, see compact_elements_legend
+    compact_elements: bool = False
 
 
 class CustomMessageManager(MessageManager):
@@ -40,43 +71,138 @@ class CustomMessageManager(MessageManager):
             settings: MessageManagerSettings = MessageManagerSettings(),
             state: MessageManagerState = MessageManagerState(),
     ):
+        self._dom_base_message: Optional[HumanMessage] = None
+        self._dom_base_url: Optional[str] = None
+        self._dom_base_entries: Dict[str, str] = {}
+        self._dom_steps_since_resync = 0
+        self._last_screenshot_fingerprint: Optional[bytes] = None
+        self._last_screenshot_hash: Optional[bytes] = None
+        self._history_summary_message: Optional[HumanMessage] = None
+        self.history_summary: str = ''
+        self._evicted_messages: List[BaseMessage] = []
+        self._prefix_len = 1
+        self._prefix_source: List[BaseMessage] = []
+        self._cached_prefix: List[BaseMessage] = []
+        self._element_ranker = ElementRanker()
+        if not isinstance(state.history, CustomMessageHistory):
+            state.history = CustomMessageHistory(
+                messages=state.history.messages,
+                current_tokens=state.history.current_tokens,
+            )
+        restored = len(state.history.messages) > 0
         super().__init__(
             task=task,
             system_message=system_message,
             settings=settings,
             state=state
         )
+        if restored:
+            self._restore_from_history()
 
     def _init_messages(self) -> None:
         """Initialize the message history with system message, context, task, and other initial messages"""
         self._add_message_with_tokens(self.system_prompt)
-        self.context_content = ""
+        self.context_content = self._get_context_content()
+        if self.context_content:
+            context_message = HumanMessage(content=self.context_content)
+            self._add_message_with_tokens(context_message)
+
+        # system and context messages never change, so they form the cacheable prompt prefix
+        self._prefix_len = len(self.state.history.messages)
+
+    def _restore_from_history(self) -> None:
+        """Pick up the messages _init_messages and earlier steps added to a history restored from a checkpoint"""
+        self.context_content = self._get_context_content()
+        self._prefix_len = 2 if self.context_content else 1
+        for managed_message in self.state.history.messages:
+            message = managed_message.message
+            if not isinstance(message, HumanMessage) or not isinstance(message.content, str):
+                continue
+            if message.content.startswith(HISTORY_SUMMARY_HEADER):
+                self._history_summary_message = message
+                self.history_summary = message.content[len(HISTORY_SUMMARY_HEADER):]
+            elif message.content.startswith(DOM_BASE_HEADER):
+                # the elements it lists are not known, the next step resends it in its place
+                self._dom_base_message = message
+
+    def _get_context_content(self) -> str:
+        """Context, sensitive data placeholders and file paths sent once after the system prompt"""
+        context_content = ""
 
         if self.settings.message_context:
-            self.context_content += 'Context for the task' + self.settings.message_context
+            context_content += 'Context for the task' + self.settings.message_context
 
         if self.settings.sensitive_data:
             info = f'Here are placeholders for sensitive data: {list(self.settings.sensitive_data.keys())}'
             info += 'To use them, write <secret>the placeholder name</secret>'
-            self.context_content += info
+            context_content += info
 
         if self.settings.available_file_paths:
             filepaths_msg = f'Here are file paths you can use: {self.settings.available_file_paths}'
-            self.context_content += filepaths_msg
+            context_content += filepaths_msg
 
-        if self.context_content:
-            context_message = HumanMessage(content=self.context_content)
-            self._add_message_with_tokens(context_message)
+        return context_content
+
+    def get_messages(self, cache_prefix: bool = True) -> List[BaseMessage]:
+        """Get current message list, with the prompt prefix marked for caching if enabled"""
+        messages = super().get_messages()
+        if not cache_prefix or not self.settings.cache_prompt_prefix:
+            return messages
+
+        prefix = messages[:self._prefix_len]
+        if len(prefix) != len(self._prefix_source) or any(a is not b for a, b in zip(prefix, self._prefix_source)):
+            # reuse the same marked copies every step so the prefix stays byte-identical
+            self._prefix_source = prefix
+            self._cached_prefix = prefix[:-1] + [self._with_cache_control(prefix[-1])]
+        return self._cached_prefix + messages[self._prefix_len:]
+
+    @staticmethod
+    def _with_cache_control(message: BaseMessage) -> BaseMessage:
+        """Copy of a message whose last content block carries an ephemeral cache breakpoint"""
+        if isinstance(message.content, str):
+            content = [{'type': 'text', 'text': message.content}]
+        else:
+            content = [dict(item) if isinstance(item, dict) else {'type': 'text', 'text': item}
+                       for item in message.content]
+        content[-1]['cache_control'] = {'type': 'ephemeral'}
+        return message.model_copy(update={'content': content})
 
     def cut_messages(self):
         """Get current message list, potentially trimmed to max tokens"""
-        diff = self.state.history.current_tokens - self.settings.max_input_tokens
         min_message_len = 2 if self.context_content is not None else 1
+        if not self.settings.compact_history:
+            self.state.history.cut_after_prefix(min_message_len, self.settings.max_input_tokens)
+            return
 
-        while diff > 0 and len(self.state.history.messages) > min_message_len:
-            msg = self.state.history.messages.pop(min_message_len)
-            self.state.history.current_tokens -= msg.metadata.tokens
-            diff = self.state.history.current_tokens - self.settings.max_input_tokens
+        # the system and context messages are kept, and so is the summary right after them
+        min_message_len = self._prefix_len
+        if self._history_summary_message is not None:
+            min_message_len += 1
+        evicted = self.state.history.cut_after_prefix(min_message_len, self.settings.max_input_tokens)
+        if evicted:
+            logger.debug(f'Set {len(evicted)} messages aside for the history summary')
+            self._evicted_messages.extend(evicted)
+
+    def pop_evicted_messages(self) -> List[BaseMessage]:
+        """Take the messages cut from history that are not folded into the summary yet"""
+        evicted, self._evicted_messages = self._evicted_messages, []
+        return evicted
+
+    def set_history_summary(self, summary: str) -> None:
+        """Add or replace the summary of the messages cut from history"""
+        self.history_summary = summary
+        summary_message = HumanMessage(
+            content=f'{HISTORY_SUMMARY_HEADER}{summary}'
+        )
+        if self._history_summary_message is not None and self.state.history.replace_message(
+                self._history_summary_message, summary_message, self._count_tokens(summary_message)
+        ):
+            self._history_summary_message = summary_message
+            return
+
+        position = self._prefix_len
+        self._add_message_with_tokens(summary_message, position=position)
+        self._history_summary_message = self.state.history.messages[position].message
 
     def add_state_message(
             self,
@@ -87,6 +213,39 @@ class CustomMessageManager(MessageManager):
             use_vision=True,
     ) -> None:
         """Add browser state as human message"""
+        state_message = self._state_message(state, actions, result, step_info, use_vision)
+        self._add_state_message(self._prepare_screenshot(state_message))
+
+    async def add_state_message_async(
+            self,
+            state: BrowserState,
+            actions: Optional[List[ActionModel]] = None,
+            result: Optional[List[ActionResult]] = None,
+            step_info: Optional[AgentStepInfo] = None,
+            use_vision=True,
+    ) -> None:
+        """add_state_message with the screenshot decoded, resized and re-encoded in a worker thread"""
+        state_message = self._state_message(state, actions, result, step_info, use_vision)
+        if self._processes_screenshots() and isinstance(state_message.content, list):
+            state_message = await asyncio.to_thread(self._prepare_screenshot, state_message)
+        self._add_state_message(state_message)
+
+    def _state_message(
+            self,
+            state: BrowserState,
+            actions: Optional[List[ActionModel]],
+            result: Optional[List[ActionResult]],
+            step_info: Optional[AgentStepInfo],
+            use_vision: bool,
+    ) -> HumanMessage:
+        elements_text = None
+        if self.settings.use_dom_diff:
+            elements_text = self._get_dom_diff_elements_text(state)
+        elif self.settings.rank_elements_top_k is not None:
+            elements_text = self._get_ranked_elements_text(state, step_info)
+        elif self.settings.compact_elements:
+            elements_text = format_elements_text(state, self._elements_listing(state))
+
         # otherwise add state message and result to next message (which will not stay in memory)
         state_message = self.settings.agent_prompt_class(
             state,
@@ -94,18 +253,169 @@ class CustomMessageManager(MessageManager):
             result,
             include_attributes=self.settings.include_attributes,
             step_info=step_info,
+            elements_text=elements_text,
         ).get_user_message(use_vision)
+        return state_message
+
+    def _add_state_message(self, state_message: HumanMessage) -> None:
         self._add_message_with_tokens(state_message)
+        if self.settings.keep_last_images is not None:
+            self._age_images(self.settings.keep_last_images)
+
+    def _age_images(self, keep_last: int) -> None:
+        """Strip the image parts of all state messages but the last keep_last ones and re-credit their tokens"""
+        kept = 0
+        for managed_message in reversed(self.state.history.messages):
+            message = managed_message.message
+            if not isinstance(message, HumanMessage) or not isinstance(message.content, list):
+                continue
+            if not any(isinstance(item, dict) and item.get('type') == 'image_url' for item in message.content):
+                continue
+            if kept < keep_last:
+                kept += 1
+                continue
+
+            content = [item for item in message.content
+                       if not (isinstance(item, dict) and item.get('type') == 'image_url')]
+            content.append({'type': 'text', 'text': '[Screenshot removed from this earlier step]'})
+            aged_message = HumanMessage(content=content)
+            tokens = self._count_tokens(aged_message)
+            self.state.history.current_tokens -= managed_message.metadata.tokens - tokens
+            managed_message.message = aged_message
+            managed_message.metadata.tokens = tokens
+
+    def _processes_screenshots(self) -> bool:
+        settings = self.settings
+        return settings.dedupe_screenshots or settings.screenshot_max_edge is not None \
+            or settings.screenshot_format != 'png'
+
+    def _prepare_screenshot(self, state_message: HumanMessage) -> HumanMessage:
+        """Downscale, re-encode and dedupe the screenshot of a state message"""
+        settings = self.settings
+        if not isinstance(state_message.content, list) or not self._processes_screenshots():
+            return state_message
+        reencode = settings.screenshot_max_edge is not None or settings.screenshot_format != 'png'
+
+        content = []
+        for item in state_message.content:
+            if item.get('type') != 'image_url':
+                content.append(item)
+                continue
+
+            screenshot = item['image_url']['url'].split(',', 1)[-1]
+            if settings.dedupe_screenshots:
+                screenshot_hash = hashlib.sha256(screenshot.encode('ascii')).digest()
+                if screenshot_hash == self._last_screenshot_hash:
+                    logger.debug('Screenshot unchanged since the last one sent, replaced by a note')
+                    content.append({'type': 'text', 'text': SCREENSHOT_OMITTED})
+                    continue
+                self._last_screenshot_hash = screenshot_hash
+                fingerprint = screenshot_fingerprint(screenshot)
+                if (
+                        self._last_screenshot_fingerprint is not None
+                        and fingerprint_distance(fingerprint, self._last_screenshot_fingerprint)
+                        <= settings.screenshot_dedupe_distance
+                ):
+                    logger.debug('Screenshot unchanged since the last one sent, replaced by a note')
+                    content.append({'type': 'text', 'text': SCREENSHOT_OMITTED})
+                    continue
+                self._last_screenshot_fingerprint = fingerprint
+
+            if not reencode:
+                content.append(item)
+                continue
+            image_data, mime_type = prepare_screenshot(
+                screenshot,
+                max_edge=settings.screenshot_max_edge,
+                image_format=settings.screenshot_format,
+                quality=settings.screenshot_quality,
+            )
+            content.append({'type': 'image_url', 'image_url': {'url': f'data:{mime_type};base64,{image_data}'}})
+
+        return HumanMessage(content=content)
+
+    def _elements_listing(self, state: BrowserState, group_siblings: bool = True) -> str:
+        """Interactive elements of the page, one entry per element unless group_siblings"""
+        if self.settings.compact_elements:
+            return compact_elements_to_string(state.element_tree, self.settings.include_attributes, group_siblings)
+        return state.element_tree.clickable_elements_to_string(include_attributes=self.settings.include_attributes)
+
+    def _get_dom_diff_elements_text(self, state: BrowserState) -> str:
+        """
+        Describe the interactive elements as the changes against a full listing kept in history.
+        The full listing is resent when the url changes, every dom_diff_resync_interval steps,
+        when it was cut from history, or when the changes outgrow half of the listing.
+        """
+        listing = self._elements_listing(state, group_siblings=False)
+        entries = split_element_entries(listing, state.selector_map)
+
+        diff = None
+        if (
+                self._dom_base_message is not None
+                and state.url == self._dom_base_url
+                and self._dom_steps_since_resync < self.settings.dom_diff_resync_interval
+                and any(m.message is self._dom_base_message for m in self.state.history.messages)
+        ):
+            diff = diff_element_entries(self._dom_base_entries, entries)
+            if len(diff) > len(listing) // 2:
+                diff = None
+
+        if diff is None:
+            self._resync_dom_base(state, listing, entries)
+            return 'See the full listing of interactive elements above.'
+
+        self._dom_steps_since_resync += 1
+        if not diff:
+            return 'No changes since the full listing of interactive elements above.'
+        return (
+                'Changes since the full listing of interactive elements above '
+                '(+ added, ~ changed, - removed, elements not listed are unchanged):\n'
+                + format_elements_text(state, diff)
+        )
+
+    def _get_ranked_elements_text(self, state: BrowserState, step_info: Optional[AgentStepInfo]) -> str:
+        """
+        Keep the rank_elements_top_k interactive elements scoring best against the task, the next goal
+        and the memory, in page order, followed by the number of elements left out.
+        """
+        listing = self._elements_listing(state, group_siblings=False)
+        entries = split_element_entries(listing, state.selector_map)
+        top_k = self.settings.rank_elements_top_k
+        if len(entries) <= top_k:
+            return format_elements_text(state, listing)
+
+        self._element_ranker.update(entries)
+        query = " ".join([
+            self.task,
+            getattr(step_info, 'next_goal', ''),
+            getattr(step_info, 'memory', ''),
+        ])
+        kept = self._element_ranker.top(query, top_k)
+        logger.debug(f'Sending {len(kept)} of {len(entries)} interactive elements ranked by relevance')
+        return (
+                format_elements_text(state, "\n".join(entries[key] for key in kept))
+                + f'\n[{len(entries) - len(kept)} interactive elements less relevant to the task are not listed, '
+                  f'scroll or extract content to find them]'
+        )
+
+    def _resync_dom_base(self, state: BrowserState, listing: str, entries: Dict[str, str]) -> None:
+        """Replace the full element listing in history"""
+        if self._dom_base_message is not None:
+            self._remove_message(self._dom_base_message)
+
+        self._dom_base_message = HumanMessage(
+            content=f'{DOM_BASE_HEADER}{state.url}, '
+                    f'later steps only report the changes against it:\n{format_elements_text(state, listing)}'
+        )
+        self._add_message_with_tokens(self._dom_base_message)
+        self._dom_base_url = state.url
+        self._dom_base_entries = entries
+        self._dom_steps_since_resync = 0
+
+    def _remove_message(self, message: BaseMessage) -> None:
+        """Remove a specific message from history"""
+        self.state.history.remove_message(message)
 
     def _remove_state_message_by_index(self, remove_ind=-1) -> None:
         """Remove state message by index from history"""
-        i = len(self.state.history.messages) - 1
-        remove_cnt = 0
-        while i >= 0:
-            if isinstance(self.state.history.messages[i].message, HumanMessage):
-                remove_cnt += 1
-            if remove_cnt == abs(remove_ind):
-                msg = self.state.history.messages.pop(i)
-                self.state.history.current_tokens -= msg.metadata.tokens
-                break
-            i -= 1
+        self.state.history.remove_human_message(-abs(remove_ind))
@@ -1,4 +1,5 @@
 import pdb
+from functools import lru_cache
 from typing import List, Optional
 
 from browser_use.agent.prompts import SystemPrompt, AgentMessagePrompt
@@ -11,13 +12,23 @@ import importlib
 from .custom_views import CustomAgentStepInfo
 
 
+@lru_cache(maxsize=None)
+def _read_system_prompt_template() -> str:
+    # This works both in development and when installed as a package
+    with importlib.resources.files('src.agent').joinpath('custom_system_prompt.md').open('r') as f:
+        return f.read()
+
+
+@lru_cache(maxsize=32)
+def _render_system_prompt(prompt_template: str, max_actions: int, available_actions: str) -> str:
+    return prompt_template.format(max_actions=max_actions, available_actions=available_actions)
+
+
 class CustomSystemPrompt(SystemPrompt):
     def _load_prompt_template(self) -> None:
-        """Load the prompt template from the markdown file."""
+        """Load the prompt template from the markdown file, read only once per process."""
         try:
-            # This works both in development and when installed as a package
-            with importlib.resources.files('src.agent').joinpath('custom_system_prompt.md').open('r') as f:
-                self.prompt_template = f.read()
+            self.prompt_template = _read_system_prompt_template()
         except Exception as e:
             raise RuntimeError(f'Failed to load system prompt template: {e}')
 
@@ -28,12 +39,35 @@ class CustomSystemPrompt(SystemPrompt):
         Returns:
             SystemMessage: Formatted system prompt
         """
-        prompt = self.prompt_template.format(max_actions=self.max_actions_per_step,
-                                             available_actions=self.default_action_description)
+        prompt = _render_system_prompt(self.prompt_template, self.max_actions_per_step,
+                                       self.default_action_description)
 
         return SystemMessage(content=prompt)
 
 
+def format_elements_text(state: BrowserState, elements_text: str) -> str:
+    """Wrap the interactive elements listing with the scroll position markers"""
+    has_content_above = (state.pixels_above or 0) > 0
+    has_content_below = (state.pixels_below or 0) > 0
+
+    if elements_text != '':
+        if has_content_above:
+            elements_text = (
+                f'... {state.pixels_above} pixels above - scroll or extract content to see more ...\n{elements_text}'
+            )
+        else:
+            elements_text = f'[Start of page]\n{elements_text}'
+        if has_content_below:
+            elements_text = (
+                f'{elements_text}\n... {state.pixels_below} pixels below - scroll or extract content to see more ...'
+            )
+        else:
+            elements_text = f'{elements_text}\n[End of page]'
+    else:
+        elements_text = 'empty page'
+    return elements_text
+
+
 class CustomAgentMessagePrompt(AgentMessagePrompt):
     def __init__(
             self,
@@ -42,6 +76,7 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
             result: Optional[List[ActionResult]] = None,
             include_attributes: list[str] = [],
             step_info: Optional[CustomAgentStepInfo] = None,
+            elements_text: Optional[str] = None,
     ):
         super(CustomAgentMessagePrompt, self).__init__(state=state,
                                                        result=result,
@@ -49,6 +84,8 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
                                                        step_info=step_info
                                                        )
         self.actions = actions
+        # prebuilt element section, e.g. the changes against the previous listing in dom diff mode
+        self.elements_text = elements_text
 
     def get_user_message(self, use_vision: bool = True) -> HumanMessage:
         if self.step_info:
@@ -59,26 +96,13 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
         time_str = datetime.now().strftime("%Y-%m-%d %H:%M")
         step_info_description += f"Current date and time: {time_str}"
 
-        elements_text = self.state.element_tree.clickable_elements_to_string(include_attributes=self.include_attributes)
-
-        has_content_above = (self.state.pixels_above or 0) > 0
-        has_content_below = (self.state.pixels_below or 0) > 0
-
-        if elements_text != '':
-            if has_content_above:
-                elements_text = (
-                    f'... {self.state.pixels_above} pixels above - scroll or extract content to see more ...\n{elements_text}'
-                )
-            else:
-                elements_text = f'[Start of page]\n{elements_text}'
-            if has_content_below:
-                elements_text = (
-                    f'{elements_text}\n... {self.state.pixels_below} pixels below - scroll or extract content to see more ...'
-                )
-            else:
-                elements_text = f'{elements_text}\n[End of page]'
+        if self.elements_text is not None:
+            elements_text = self.elements_text
         else:
-            elements_text = 'empty page'
+            elements_text = format_elements_text(
+                self.state,
+                self.state.element_tree.clickable_elements_to_string(include_attributes=self.include_attributes)
+            )
 
         state_description = f"""
 {step_info_description}
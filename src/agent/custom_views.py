@@ -1,10 +1,17 @@
-from dataclasses import dataclass
-from typing import Any, Dict, List, Literal, Optional, Type
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Literal, Optional, Type
 import uuid
 
-from browser_use.agent.views import AgentOutput, AgentState, ActionResult, AgentHistoryList, MessageManagerState
+from browser_use.agent.message_manager.views import ManagedMessage, MessageHistory, MessageMetadata
+from browser_use.agent.views import AgentOutput, AgentState, ActionResult, AgentHistory, AgentHistoryList, \
+    MessageManagerState, StepMetadata
 from browser_use.controller.registry.views import ActionModel
-from pydantic import BaseModel, ConfigDict, Field, create_model
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, create_model
+
+from ..utils.extracted_pages import ExtractedPageStore
+from ..utils.memory_store import MemoryStore
 
 
 @dataclass
@@ -14,6 +21,27 @@ class CustomAgentStepInfo:
     task: str
     add_infos: str
     memory: str
+    # memory is rendered from this store within the memory token budget
+    memory_store: MemoryStore = field(default_factory=MemoryStore)
+    next_goal: str = ""
+
+
+class CustomStepMetadata(StepMetadata):
+    """Step metadata with the timing of each phase of the step"""
+
+    phases: List[Dict[str, Any]] = Field(default_factory=list)
+
+
+class CustomAgentHistory(AgentHistory):
+    """History item whose metadata keeps the phase timings when it is loaded back"""
+
+    metadata: Optional[CustomStepMetadata] = None
+
+
+class CustomAgentHistoryList(AgentHistoryList):
+    """History list of CustomAgentHistory items, used when a history is read back from a file or checkpoint"""
+
+    history: List[CustomAgentHistory]
 
 
 class CustomAgentBrain(BaseModel):
@@ -51,17 +79,123 @@ class CustomAgentOutput(AgentOutput):
         return model_
 
 
+class CustomMessageHistory(MessageHistory):
+    """
+    Message history backed by a deque, with an index of the human messages in order.
+    Evicting right after the protected prefix and removing recent state messages don't
+    shift or scan the whole history.
+    """
+
+    messages: Deque[ManagedMessage] = Field(default_factory=deque)
+    _human_messages: Deque[ManagedMessage] = PrivateAttr(default_factory=deque)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._human_messages = deque(m for m in self.messages if isinstance(m.message, HumanMessage))
+
+    def add_message(self, message: BaseMessage, metadata: MessageMetadata, position: int | None = None) -> None:
+        """Add message with metadata to history"""
+        managed_message = ManagedMessage(message=message, metadata=metadata)
+        if position is None:
+            self.messages.append(managed_message)
+            if isinstance(message, HumanMessage):
+                self._human_messages.append(managed_message)
+        else:
+            self.messages.insert(position, managed_message)
+            if isinstance(message, HumanMessage):
+                self.model_post_init(None)
+        self.current_tokens += metadata.tokens
+
+    def remove_oldest_message(self) -> None:
+        """Remove oldest non-system message"""
+        for i, msg in enumerate(self.messages):
+            if not isinstance(msg.message, SystemMessage):
+                self.remove_message_at(i)
+                break
+
+    def remove_last_state_message(self) -> None:
+        """Remove last state message from history"""
+        if len(self.messages) > 2 and isinstance(self.messages[-1].message, HumanMessage):
+            self.remove_message_at(-1)
+
+    def cut_after_prefix(self, prefix_len: int, max_tokens: int) -> List[BaseMessage]:
+        """
+        Evict the oldest messages after the first prefix_len ones until the history fits max_tokens.
+        Returns the evicted messages, oldest first.
+        """
+        evicted = []
+        if self.current_tokens <= max_tokens or len(self.messages) <= prefix_len:
+            return evicted
+        prefix = [self.messages.popleft() for _ in range(prefix_len)]
+        while self.current_tokens > max_tokens and self.messages:
+            msg = self.messages.popleft()
+            self.current_tokens -= msg.metadata.tokens
+            if isinstance(msg.message, HumanMessage):
+                self._unindex(msg, from_end=False)
+            evicted.append(msg.message)
+        self.messages.extendleft(reversed(prefix))
+        return evicted
+
+    def replace_message(self, message: BaseMessage, new_message: BaseMessage, tokens: int) -> bool:
+        """Replace a message of the same type in place, returns False if it is not in history"""
+        for managed_message in self.messages:
+            if managed_message.message is message:
+                self.current_tokens += tokens - managed_message.metadata.tokens
+                managed_message.message = new_message
+                managed_message.metadata.tokens = tokens
+                return True
+        return False
+
+    def remove_message(self, message: BaseMessage) -> None:
+        """Remove a specific message from history, searching from the most recent one"""
+        for i in range(len(self.messages) - 1, -1, -1):
+            if self.messages[i].message is message:
+                self.remove_message_at(i)
+                break
+
+    def remove_human_message(self, index: int = -1) -> None:
+        """Remove a human message by its index among the human messages"""
+        if not -len(self._human_messages) <= index < len(self._human_messages):
+            return
+        managed_message = self._human_messages[index]
+        for i in range(len(self.messages) - 1, -1, -1):
+            if self.messages[i] is managed_message:
+                self.remove_message_at(i)
+                break
+
+    def remove_message_at(self, index: int) -> None:
+        """Remove the message at a position of the history"""
+        msg = self.messages[index]
+        del self.messages[index]
+        self.current_tokens -= msg.metadata.tokens
+        if isinstance(msg.message, HumanMessage):
+            self._unindex(msg)
+
+    def _unindex(self, msg: ManagedMessage, from_end: bool = True) -> None:
+        """Drop a message from the human message index, searching from the end it is expected near"""
+        indices = range(len(self._human_messages) - 1, -1, -1) if from_end else range(len(self._human_messages))
+        for i in indices:
+            if self._human_messages[i] is msg:
+                del self._human_messages[i]
+                break
+
+
+class CustomMessageManagerState(MessageManagerState):
+    """Message manager state holding a CustomMessageHistory"""
+
+    history: CustomMessageHistory = Field(default_factory=CustomMessageHistory)
+
+
 class CustomAgentState(BaseModel):
     agent_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     n_steps: int = 1
     consecutive_failures: int = 0
     last_result: Optional[List['ActionResult']] = None
-    history: AgentHistoryList = Field(default_factory=lambda: AgentHistoryList(history=[]))
+    history: CustomAgentHistoryList = Field(default_factory=lambda: CustomAgentHistoryList(history=[]))
     last_plan: Optional[str] = None
     paused: bool = False
     stopped: bool = False
 
-    message_manager_state: MessageManagerState = Field(default_factory=MessageManagerState)
+    message_manager_state: CustomMessageManagerState = Field(default_factory=CustomMessageManagerState)
 
     last_action: Optional[List['ActionModel']] = None
-    extracted_content: str = ''
+    extracted_pages: ExtractedPageStore = Field(default_factory=ExtractedPageStore)
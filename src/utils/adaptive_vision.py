@@ -0,0 +1,87 @@
+import copy
+from typing import List, Optional
+
+from browser_use.agent.views import ActionModel, ActionResult
+from browser_use.controller.registry.views import ActionRegistry, RegisteredAction
+from browser_use.controller.service import Controller
+from browser_use.dom.views import DOMElementNode
+from pydantic import create_model
+
+from src.utils.trajectory_cache import normalize_url
+
+# content the element tree can't describe
+VISUAL_TAGS = {'canvas', 'iframe', 'embed', 'object'}
+# smaller ones are trackers, ad slots and captcha badges, 200x150 pixels
+MIN_VISUAL_AREA = 200 * 150
+REQUEST_SCREENSHOT_ACTION = 'request_screenshot'
+
+
+async def request_screenshot() -> ActionResult:
+    return ActionResult(extracted_content='The next state includes a screenshot')
+
+
+# built once so that agents adding it share the same action signature, and the cached action models
+_REQUEST_SCREENSHOT = RegisteredAction(
+    name=REQUEST_SCREENSHOT_ACTION,
+    description='Get a screenshot of the page with the next state, when the interactive elements '
+                'are not enough to understand the page',
+    function=request_screenshot,
+    param_model=create_model(f'{REQUEST_SCREENSHOT_ACTION}_parameters', __base__=ActionModel),
+)
+
+
+def with_request_screenshot(controller: Controller) -> Controller:
+    """Copy of the controller with the request_screenshot action, the given controller is left untouched"""
+    if REQUEST_SCREENSHOT_ACTION in controller.registry.registry.actions:
+        return controller
+    controller = copy.copy(controller)
+    controller.registry = copy.copy(controller.registry)
+    controller.registry.registry = ActionRegistry(
+        actions={**controller.registry.registry.actions, REQUEST_SCREENSHOT_ACTION: _REQUEST_SCREENSHOT})
+    return controller
+
+
+def count_visual_elements(root: DOMElementNode, min_area: int = MIN_VISUAL_AREA) -> int:
+    """Visible canvas, iframe, embed and object elements, of at least min_area when their size is known"""
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, DOMElementNode):
+            if node.tag_name in VISUAL_TAGS and node.is_visible:
+                coordinates = node.page_coordinates or node.viewport_coordinates
+                if coordinates is None or coordinates.width * coordinates.height >= min_area:
+                    count += 1
+            stack.extend(node.children)
+    return count
+
+
+class VisionTrigger:
+    """
+    Decides whether a step needs the screenshot: the first step on a url, after a failed action,
+    on pages with canvas or iframe content, or when the model asked for one with request_screenshot.
+    """
+
+    def __init__(self, min_visual_elements: int = 1):
+        self.min_visual_elements = min_visual_elements
+        self._visited_urls: set[str] = set()
+
+    def reason(
+            self,
+            url: str,
+            element_tree: Optional[DOMElementNode],
+            last_result: Optional[List[ActionResult]],
+            last_action: Optional[List[ActionModel]],
+    ) -> Optional[str]:
+        """Why the screenshot should be sent, None for a text only step"""
+        url = normalize_url(url)
+        if url not in self._visited_urls:
+            self._visited_urls.add(url)
+            return 'first step on this url'
+        if any(result.error for result in last_result or []):
+            return 'the previous action failed'
+        if any(REQUEST_SCREENSHOT_ACTION in action.model_dump(exclude_unset=True) for action in last_action or []):
+            return 'requested by the model'
+        if element_tree is not None and count_visual_elements(element_tree) >= self.min_visual_elements:
+            return 'canvas or iframe content'
+        return None
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+from collections import deque
+from typing import Any, Dict, List, Tuple, Type
+
+from browser_use.agent.message_manager.views import ManagedMessage, MessageMetadata
+from browser_use.agent.views import ActionResult, AgentOutput
+from langchain_core.messages import BaseMessage
+
+from src.agent.custom_views import CustomAgentHistoryList, CustomAgentState, CustomMessageHistory, \
+    CustomMessageManagerState
+from src.utils.extracted_pages import ExtractedPageStore
+from src.utils.history_writer import BLOB_REF, blob_key, dump_message, load_blob, load_message, write_blob
+
+logger = logging.getLogger(__name__)
+
+
+class AgentCheckpointer:
+    """
+    Appends what changed in a CustomAgentState since the previous checkpoint to <dir>/<agent_id>.jsonl,
+    one line per checkpoint. Messages are written once and referenced by id, screenshots are stored once
+    per content hash in <dir>/blobs. load_checkpoint() folds the lines back into the last state.
+    """
+
+    def __init__(self, checkpoint_dir: str, agent_id: str):
+        self.path = os.path.join(checkpoint_dir, f"{agent_id}.jsonl")
+        self.blob_dir = os.path.join(checkpoint_dir, "blobs")
+        self._history_len = 0
+        self._pages = 0
+        self._message_ids: set[str] = set()
+        # ManagedMessage objects of the last checkpoint with the message and tokens their id was taken from,
+        # aging screenshots and replace_message() swap the message of a ManagedMessage
+        self._ids_by_message: Dict[int, Tuple[ManagedMessage, BaseMessage, int, str]] = {}
+        self._blobs: set[str] = set()
+
+    def mark_saved(self, state: CustomAgentState) -> None:
+        """The state was loaded from this checkpoint, only write what changes from now on"""
+        self._history_len = len(state.history.history)
+        self._pages = len(state.extracted_pages)
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # end the line of a checkpoint cut short, the next one starts on its own line
+                    f.write(b"\n")
+
+    def delta(self, state: CustomAgentState) -> Tuple[Dict[str, Any], List[Tuple[str, str]]]:
+        """The checkpoint record and the new blobs it references, taken on the event loop so it is consistent"""
+        blobs = []
+
+        def blob(screenshot: str) -> str:
+            key = blob_key(screenshot)
+            if key not in self._blobs:
+                self._blobs.add(key)
+                blobs.append((key, screenshot))
+            return BLOB_REF + key
+
+        # the last item can still be updated at the end of a run, it is written again
+        history_start = max(self._history_len - 1, 0)
+        history = []
+        for item in state.history.history[history_start:]:
+            data = item.model_dump()
+            if data["state"].get("screenshot"):
+                data["state"]["screenshot"] = blob(data["state"]["screenshot"])
+            history.append(data)
+
+        message_ids = []
+        new_messages = {}
+        ids_by_message = {}
+        for managed in state.message_manager_state.history.messages:
+            known = self._ids_by_message.get(id(managed))
+            if known and known[0] is managed and known[1] is managed.message \
+                    and known[2] == managed.metadata.tokens:
+                message_id = known[3]
+            else:
+                data = {"message": dump_message(managed.message, blob), "tokens": managed.metadata.tokens}
+                message_id = hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+                if message_id not in self._message_ids:
+                    self._message_ids.add(message_id)
+                    new_messages[message_id] = data
+            ids_by_message[id(managed)] = (managed, managed.message, managed.metadata.tokens, message_id)
+            message_ids.append(message_id)
+        self._ids_by_message = ids_by_message
+
+        pages = state.extracted_pages
+        record = {
+            "agent_id": state.agent_id,
+            "n_steps": state.n_steps,
+            "consecutive_failures": state.consecutive_failures,
+            "last_result": [r.model_dump(exclude_none=True) for r in state.last_result] if state.last_result else None,
+            "last_plan": state.last_plan,
+            "last_action": [a.model_dump(exclude_none=True) for a in state.last_action] if state.last_action else None,
+            "history_start": history_start,
+            "history": history,
+            "messages": message_ids,
+            "new_messages": new_messages,
+            "current_tokens": state.message_manager_state.history.current_tokens,
+            "tool_id": state.message_manager_state.tool_id,
+            "pages": [[key, pages.pages[key]] for key in pages.order[self._pages:]],
+            "spill_dir": pages.spill_dir,
+            "spill_size": pages.spill_size,
+        }
+        self._history_len = len(state.history.history)
+        self._pages = len(pages)
+        return record, blobs
+
+    def write(self, record: Dict[str, Any], blobs: List[Tuple[str, str]]) -> None:
+        for key, screenshot in blobs:
+            write_blob(self.blob_dir, key, screenshot)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    async def save(self, state: CustomAgentState) -> None:
+        record, blobs = self.delta(state)
+        await asyncio.to_thread(self.write, record, blobs)
+
+    def remove(self) -> None:
+        """Delete the checkpoint of a finished run, and the blobs once no other checkpoint can reference them"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        checkpoint_dir = os.path.dirname(self.path) or "."
+        if not any(name.endswith(".jsonl") for name in os.listdir(checkpoint_dir)):
+            shutil.rmtree(self.blob_dir, ignore_errors=True)
+        self._history_len = 0
+        self._pages = 0
+        self._message_ids = set()
+        self._ids_by_message = {}
+        self._blobs = set()
+
+
+def load_checkpoint(path: str, output_model: Type[AgentOutput]) -> CustomAgentState:
+    """Rebuild the state of the last complete checkpoint in path, pause and stop flags are not kept"""
+    blob_dir = os.path.join(os.path.dirname(path), "blobs")
+    history = []
+    messages = {}
+    page_order = []
+    page_contents = {}
+    record = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                line_record = json.loads(line)
+            except json.JSONDecodeError:
+                # the process died while writing this line, the resumed run wrote the next ones
+                logger.warning(f"Ignoring truncated checkpoint in {path}")
+                continue
+            record = line_record
+            history[record["history_start"]:] = record["history"]
+            messages.update(record["new_messages"])
+            for key, content in record["pages"]:
+                page_order.append(key)
+                page_contents[key] = content
+    if record is None:
+        raise ValueError(f"No checkpoint in {path}")
+
+    for data in history:
+        screenshot = data["state"].get("screenshot")
+        if screenshot and screenshot.startswith(BLOB_REF):
+            data["state"]["screenshot"] = load_blob(screenshot, blob_dir)
+        if data["model_output"]:
+            data["model_output"] = output_model.model_validate(data["model_output"])
+        data["state"].setdefault("interacted_element", None)
+
+    action_model = output_model.model_fields["action"].annotation.__args__[0]
+    message_history = CustomMessageHistory(
+        messages=deque(
+            ManagedMessage(message=load_message(messages[message_id]["message"], blob_dir),
+                           metadata=MessageMetadata(tokens=messages[message_id]["tokens"]))
+            for message_id in record["messages"]
+        ),
+        current_tokens=record["current_tokens"],
+    )
+    return CustomAgentState(
+        agent_id=record["agent_id"],
+        n_steps=record["n_steps"],
+        consecutive_failures=record["consecutive_failures"],
+        last_result=[ActionResult.model_validate(r) for r in record["last_result"]] if record["last_result"] else None,
+        history=CustomAgentHistoryList.model_validate({"history": history}),
+        last_plan=record["last_plan"],
+        message_manager_state=CustomMessageManagerState(history=message_history, tool_id=record["tool_id"]),
+        last_action=[action_model.model_validate(a) for a in record["last_action"]] if record["last_action"] else None,
+        extracted_pages=ExtractedPageStore(order=page_order, pages=page_contents, spill_dir=record["spill_dir"],
+                                           spill_size=record["spill_size"]),
+    )
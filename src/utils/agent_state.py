@@ -1,12 +1,64 @@
 import asyncio
 
 
-class AgentState:
+class AgentControl:
+    """Event based stop / pause / resume channel that agents can await"""
+
+    def __init__(self):
+        self._stop_requested = asyncio.Event()
+        self._pause_requested = asyncio.Event()
+        self._running = asyncio.Event()
+        self._running.set()
+        # set by stop or pause, lets in-flight work be interrupted with a single wait
+        self._interrupt = asyncio.Event()
+
+    def request_stop(self):
+        self._stop_requested.set()
+        self._interrupt.set()
+        # wake up paused agents so they can exit
+        self._running.set()
+
+    def clear_stop(self):
+        self._stop_requested.clear()
+        self._pause_requested.clear()
+        self._interrupt.clear()
+        self._running.set()
+
+    def is_stop_requested(self):
+        return self._stop_requested.is_set()
+
+    async def wait_for_stop(self):
+        await self._stop_requested.wait()
+
+    def request_pause(self):
+        self._pause_requested.set()
+        self._running.clear()
+        self._interrupt.set()
+
+    def resume(self):
+        self._pause_requested.clear()
+        if not self._stop_requested.is_set():
+            self._interrupt.clear()
+        self._running.set()
+
+    def is_paused(self):
+        return self._pause_requested.is_set()
+
+    async def wait_until_resumed(self):
+        """Wait while paused, returns right away when running or stopped"""
+        await self._running.wait()
+
+    async def wait_for_interrupt(self):
+        """Wait until a stop or a pause is requested"""
+        await self._interrupt.wait()
+
+
+class AgentState(AgentControl):
     _instance = None
 
     def __init__(self):
         if not hasattr(self, '_stop_requested'):
-            self._stop_requested = asyncio.Event()
+            super().__init__()
             self.last_valid_state = None  # store the last valid browser state
 
     def __new__(cls):
@@ -14,16 +66,10 @@ class AgentState:
             cls._instance = super(AgentState, cls).__new__(cls)
         return cls._instance
 
-    def request_stop(self):
-        self._stop_requested.set()
-
     def clear_stop(self):
-        self._stop_requested.clear()
+        super().clear_stop()
         self.last_valid_state = None
 
-    def is_stop_requested(self):
-        return self._stop_requested.is_set()
-
     def set_last_valid_state(self, state):
         self.last_valid_state = state
 
@@ -0,0 +1,124 @@
+from typing import List, Tuple, Union
+
+from browser_use.dom.views import DOMBaseNode, DOMElementNode, DOMTextNode
+
+# short keys of the usual include_attributes, other attributes keep their name
+SHORT_KEYS = {
+    'title': 'ti',
+    'type': 'ty',
+    'name': 'n',
+    'role': 'r',
+    'aria-label': 'l',
+    'placeholder': 'p',
+    'value': 'v',
+    'alt': 'a',
+    'aria-expanded': 'x',
+    'data-date-format': 'df',
+}
+# role a tag has anyway, e.g. role=button on a button
+IMPLICIT_ROLES = {
+    'a': 'link',
+    'button': 'button',
+    'input': 'textbox',
+    'textarea': 'textbox',
+    'select': 'combobox',
+    'option': 'option',
+    'img': 'img',
+    'li': 'listitem',
+}
+DEFAULT_VALUES = {
+    ('input', 'type'): 'text',
+}
+# fewer consecutive elements of the same shape are listed one per line
+MIN_GROUP_SIZE = 3
+# shorter texts of the previous element are not worth replacing by ^
+MIN_REPEATED_TEXT = 12
+
+
+def compact_elements_legend(include_attributes: List[str]) -> str:
+    """Format description for the system prompt, the keys are declared there once"""
+    keys = ', '.join(f'{SHORT_KEYS.get(name, name)}={name}' for name in include_attributes)
+    return (
+        '# Interactive elements format\n'
+        'Interactive elements are listed as [index]<tag key=value ...>text with these attribute keys: '
+        f'{keys}.\n'
+        'Empty and default attribute values are left out, ^ in a value stands for the text of the previous '
+        'element. Consecutive elements with the same tag and attributes are grouped on one line as '
+        '<tag key=value ...>xN: [index]text | [index]text ...'
+    )
+
+
+def _format_value(value: str) -> str:
+    value = ' '.join(value.split())
+    if ' ' in value or '>' in value or not value:
+        return '"' + value.replace('"', "'") + '"'
+    return value
+
+
+def _element_shape(node: DOMElementNode, text: str, include_attributes: List[str], previous_text: str) -> str:
+    tag = node.tag_name
+    seen = {tag, text}
+    parts = [tag]
+    for name in include_attributes:
+        value = ' '.join(str(node.attributes.get(name, '')).split())
+        if not value or value in seen:
+            continue
+        if DEFAULT_VALUES.get((tag, name)) == value or (name == 'role' and IMPLICIT_ROLES.get(tag) == value):
+            continue
+        seen.add(value)
+        if len(previous_text) >= MIN_REPEATED_TEXT:
+            # e.g. the alt of a product image or the label of its add to cart button repeat the product name
+            value = value.replace(previous_text, '^')
+        parts.append(f'{SHORT_KEYS.get(name, name)}={_format_value(value)}')
+    return '<' + ' '.join(parts) + '>'
+
+
+def compact_elements_to_string(
+        root: DOMElementNode,
+        include_attributes: List[str],
+        group_siblings: bool = True,
+) -> str:
+    """
+    Same content as clickable_elements_to_string in a shorter form: one line per element with short
+    attribute keys, no default values, and runs of elements of the same shape grouped on one line.
+    """
+    # (index, shape, text) of an interactive element, or a plain text line
+    items: List[Union[Tuple[int, str, str], str]] = []
+    previous_text = ''
+
+    def process_node(node: DOMBaseNode) -> None:
+        nonlocal previous_text
+        if isinstance(node, DOMElementNode):
+            if node.highlight_index is not None:
+                text = ' '.join(node.get_all_text_till_next_clickable_element().split())
+                items.append((node.highlight_index, _element_shape(node, text, include_attributes, previous_text),
+                              text))
+                if text:
+                    previous_text = text
+            for child in node.children:
+                process_node(child)
+        elif isinstance(node, DOMTextNode):
+            if not node.has_parent_with_highlight_index() and node.is_visible:
+                items.append(node.text)
+
+    process_node(root)
+
+    lines = []
+    i = 0
+    while i < len(items):
+        item = items[i]
+        if isinstance(item, str):
+            lines.append(item)
+            i += 1
+            continue
+        end = i + 1
+        if group_siblings:
+            while end < len(items) and not isinstance(items[end], str) and items[end][1] == item[1]:
+                end += 1
+        if end - i >= MIN_GROUP_SIZE:
+            elements = ' | '.join(f'[{index}]{text}' for index, _, text in items[i:end])
+            lines.append(f'{item[1]}x{end - i}: {elements}')
+        else:
+            lines.extend(f'[{index}]{shape}{text}' for index, shape, text in items[i:end])
+        i = end
+    return '\n'.join(lines)
@@ -11,6 +11,7 @@ from pprint import pprint
 from uuid import uuid4
 from src.utils import utils
 from src.agent.custom_agent import CustomAgent
+from src.utils.retry_scheduler import RetryScheduler
 import json
 import re
 from browser_use.agent.service import Agent
@@ -77,6 +78,8 @@ async def deep_research(task, llm, agent_state=None, **kwargs):
         browser_context = None
 
     controller = CustomController()
+    # shared by all agents, so a rate limit hit by one of them holds back the others
+    retry_scheduler = RetryScheduler()
 
     @controller.registry.action(
         'Extract page content to get the pure markdown.',
@@ -198,7 +201,7 @@ Provide your output as a JSON formatted list. Each item in the list must adhere
             history_infos_ = json.dumps(history_infos, indent=4)
             query_prompt = f"This is search {search_iteration} of {max_search_iterations} maximum searches allowed.\n User Instruction:{task} \n Previous Queries:\n {history_query_} \n Previous Search Results:\n {history_infos_}\n"
             search_messages.append(HumanMessage(content=query_prompt))
-            ai_query_msg = llm.invoke(search_messages[:1] + search_messages[1:][-1:])
+            ai_query_msg = await llm.ainvoke(search_messages[:1] + search_messages[1:][-1:])
             search_messages.append(ai_query_msg)
             if hasattr(ai_query_msg, "reasoning_content"):
                 logger.info("🤯 Start Search Deep Thinking: ")
@@ -234,7 +237,9 @@ Provide your output as a JSON formatted list. Each item in the list must adhere
                     system_prompt_class=CustomSystemPrompt,
                     agent_prompt_class=CustomAgentMessagePrompt,
                     max_actions_per_step=5,
-                    controller=controller
+                    controller=controller,
+                    agent_state=agent_state,
+                    retry_scheduler=retry_scheduler,
                 )
                 agent_result = await agent.run(max_steps=kwargs.get("max_steps", 10))
                 query_results = [agent_result]
@@ -257,6 +262,8 @@ Provide your output as a JSON formatted list. Each item in the list must adhere
                     agent_prompt_class=CustomAgentMessagePrompt,
                     max_actions_per_step=5,
                     controller=controller,
+                    agent_state=agent_state,
+                    retry_scheduler=retry_scheduler,
                 ) for task in query_tasks]
                 query_results = await asyncio.gather(
                     *[agent.run(max_steps=kwargs.get("max_steps", 10)) for agent in agents])
@@ -287,7 +294,7 @@ Provide your output as a JSON formatted list. Each item in the list must adhere
                     history_infos_ = json.dumps(history_infos, indent=4)
                     record_prompt = f"User Instruction:{task}. \nPrevious Recorded Information:\n {history_infos_}\n Current Search Iteration: {search_iteration}\n Current Search Plan:\n{query_plan}\n Current Search Query:\n {query_tasks[i]}\n Current Search Results: {query_result_}\n "
                     record_messages.append(HumanMessage(content=record_prompt))
-                    ai_record_msg = llm.invoke(record_messages[:1] + record_messages[-1:])
+                    ai_record_msg = await llm.ainvoke(record_messages[:1] + record_messages[-1:])
                     record_messages.append(ai_record_msg)
                     if hasattr(ai_record_msg, "reasoning_content"):
                         logger.info("🤯 Start Record Deep Thinking: ")
@@ -361,7 +368,7 @@ async def generate_final_report(task, history_infos, save_dir, llm, error_msg=No
         report_prompt = f"User Instruction:{task} \n Search Information:\n {history_infos_}"
         report_messages = [SystemMessage(content=writer_system_prompt),
                            HumanMessage(content=report_prompt)]  # New context for report generation
-        ai_report_msg = llm.invoke(report_messages)
+        ai_report_msg = await llm.ainvoke(report_messages)
         if hasattr(ai_report_msg, "reasoning_content"):
             logger.info("🤯 Start Report Deep Thinking: ")
             logger.info(ai_report_msg.reasoning_content)
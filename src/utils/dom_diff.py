@@ -0,0 +1,45 @@
+import re
+from typing import Dict
+
+ELEMENT_LINE = re.compile(r"^\[(\d+)\]<")
+
+
+def split_element_entries(elements_text: str, selector_map: Dict[int, object]) -> Dict[str, str]:
+    """
+    Split the output of clickable_elements_to_string into one entry per interactive element,
+    keyed by the element xpath so that entries can be matched across steps even if indexes shift.
+    Plain text lines are kept with the interactive element they follow.
+    """
+    entries = {}
+    key = ""
+    lines = []
+    for line in elements_text.split("\n"):
+        match = ELEMENT_LINE.match(line)
+        if match:
+            if lines:
+                entries[key] = "\n".join(lines)
+            node = selector_map.get(int(match.group(1)))
+            key = getattr(node, "xpath", None) or f"index:{match.group(1)}"
+            # the same xpath can appear in several frames
+            while key in entries:
+                key += "'"
+            lines = [line]
+        else:
+            lines.append(line)
+    if lines and any(lines):
+        entries[key] = "\n".join(lines)
+    return entries
+
+
+def diff_element_entries(old: Dict[str, str], new: Dict[str, str]) -> str:
+    """Render added (+), changed (~) and removed (-) entries between two element listings"""
+    lines = []
+    for key, entry in new.items():
+        if key not in old:
+            lines.append(f"+ {entry}")
+        elif old[key] != entry:
+            lines.append(f"~ {entry}")
+    for key, entry in old.items():
+        if key not in new:
+            lines.append(f"- {entry}")
+    return "\n".join(lines)
@@ -0,0 +1,76 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def _terms(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+class ElementRanker:
+    """
+    BM25 index over the interactive element entries of the page, keyed like split_element_entries.
+    update() only re-indexes the entries that were added or changed since the previous step.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._entries: Dict[str, str] = {}
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        # keys of the current listing in page order
+        self._order: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        for term in set(_terms(self._entries.pop(key))):
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(key)
+
+    def update(self, entries: Dict[str, str]) -> None:
+        """Make the index match the entries of the current listing"""
+        for key in [key for key in self._entries if entries.get(key) != self._entries[key]]:
+            self._remove(key)
+        for key, entry in entries.items():
+            if key in self._entries:
+                continue
+            terms = _terms(entry)
+            for term, count in Counter(terms).items():
+                self._postings.setdefault(term, {})[key] = count
+            self._entries[key] = entry
+            self._lengths[key] = len(terms)
+            self._total_length += len(terms)
+        self._order = {key: i for i, key in enumerate(entries)}
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """BM25 score of every indexed entry matching at least one query term"""
+        n_docs = len(self._entries)
+        if not n_docs:
+            return {}
+        average_length = self._total_length / n_docs or 1
+        scores: Dict[str, float] = {}
+        for term in set(_terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[key] / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def top(self, query: str, k: int) -> List[str]:
+        """Keys of the k best entries in page order, ties and unmatched entries go by page order"""
+        scores = self.scores(query)
+        best = sorted(self._order, key=lambda key: (-scores.get(key, 0.0), self._order[key]))[:k]
+        return sorted(best, key=self._order.__getitem__)
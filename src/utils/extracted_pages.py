@@ -0,0 +1,51 @@
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ExtractedPageStore(BaseModel):
+    """
+    Extracted pages keyed by the hash of their content, in the order they were first extracted.
+    Pages larger than spill_size are written to spill_dir and only read back when rendering.
+    """
+
+    order: List[str] = Field(default_factory=list)
+    # page content, or None if it was spilled to disk
+    pages: Dict[str, Optional[str]] = Field(default_factory=dict)
+    spill_dir: Optional[str] = None
+    spill_size: int = 100_000
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.txt")
+
+    def add(self, content: str) -> bool:
+        """Store a page, returns False if the same content was already stored"""
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if key in self.pages:
+            return False
+        if self.spill_dir and len(content) > self.spill_size:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self._spill_path(key), "w", encoding="utf-8") as f:
+                f.write(content)
+            self.pages[key] = None
+        else:
+            self.pages[key] = content
+        self.order.append(key)
+        return True
+
+    def iter_pages(self):
+        for key in self.order:
+            content = self.pages[key]
+            if content is None:
+                with open(self._spill_path(key), "r", encoding="utf-8") as f:
+                    content = f.read()
+            yield content
+
+    def render(self) -> str:
+        """All pages concatenated, built only when the final result is needed"""
+        return "".join(self.iter_pages())
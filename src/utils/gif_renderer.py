@@ -0,0 +1,161 @@
+import asyncio
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, forking the event loop / browser process is not safe
+        _pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+@lru_cache(maxsize=None)
+def _load_fonts(font_size: int = 40, title_font_size: int = 56):
+    """Same font choice as browser_use create_history_gif"""
+    from PIL import ImageFont
+
+    for font_name in ['Helvetica', 'Arial', 'DejaVuSans', 'Verdana']:
+        try:
+            if platform.system() == 'Windows':
+                # Need to specify the abs font path on Windows
+                font_name = os.path.join(os.getenv('WIN_FONT_DIR', 'C:\\Windows\\Fonts'), font_name + '.ttf')
+            return ImageFont.truetype(font_name, font_size), ImageFont.truetype(font_name, title_font_size)
+        except OSError:
+            continue
+    return ImageFont.load_default(), ImageFont.load_default()
+
+
+def _downscale(image, max_edge: Optional[int]):
+    from PIL import Image
+
+    if max_edge and max(image.size) > max_edge:
+        scale = max_edge / max(image.size)
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.Resampling.LANCZOS)
+    return image
+
+
+def _render_frame(screenshot: str, step_number: int, goal: Optional[str], frame_path: str,
+                  max_edge: Optional[int]) -> str:
+    """Decode a screenshot, draw the step overlay and save the downscaled frame"""
+    from PIL import Image
+    from browser_use.agent.gif import _add_overlay_to_image
+
+    image = Image.open(io.BytesIO(base64.b64decode(screenshot)))
+    if goal is not None:
+        regular_font, title_font = _load_fonts()
+        image = _add_overlay_to_image(
+            image=image,
+            step_number=step_number,
+            goal_text=goal,
+            regular_font=regular_font,
+            title_font=title_font,
+            margin=40,
+            logo=None,
+        )
+    _downscale(image, max_edge).convert('RGB').save(frame_path, 'PNG')
+    return frame_path
+
+
+def _render_task_frame(task: str, screenshot: str, frame_path: str, max_edge: Optional[int]) -> str:
+    from browser_use.agent.gif import _create_task_frame
+
+    regular_font, title_font = _load_fonts()
+    image = _create_task_frame(task, screenshot, title_font, regular_font, None, 1.5)
+    _downscale(image, max_edge).convert('RGB').save(frame_path, 'PNG')
+    return frame_path
+
+
+def _assemble_gif(frame_paths: List[str], output_path: str, duration: int) -> str:
+    from PIL import Image
+
+    frames = [Image.open(path) for path in frame_paths]
+    frames[0].save(
+        output_path,
+        save_all=True,
+        append_images=frames[1:],
+        duration=duration,
+        loop=0,
+        optimize=False,
+    )
+    return output_path
+
+
+class GifRenderer:
+    """
+    Renders the history GIF in a worker process while the agent runs: each step is turned into a
+    frame on disk as soon as it is recorded, and finish() only has to assemble them.
+    """
+
+    def __init__(self, task: str, output_path: str, frame_max_edge: Optional[int] = None, duration: int = 3000):
+        self.task = task
+        self.output_path = output_path
+        self.frame_max_edge = frame_max_edge
+        self.duration = duration
+        self._frame_dir = tempfile.mkdtemp(prefix="agent_gif_")
+        self._frames: List[Future] = []
+        self._n_steps = 0
+        self._disabled = False
+
+    def _next_frame_path(self) -> str:
+        return os.path.join(self._frame_dir, f"{len(self._frames):05d}.png")
+
+    def add_step(self, screenshot: Optional[str], goal: Optional[str]) -> None:
+        """Queue the frame of the next history item"""
+        self._n_steps += 1
+        if self._n_steps == 1 and not screenshot:
+            # like create_history_gif, no GIF without a first screenshot
+            logger.warning('No first screenshot to create GIF from')
+            self._disabled = True
+        if self._disabled or not screenshot:
+            return
+        if not self._frames and self.task:
+            self._frames.append(_get_pool().submit(
+                _render_task_frame, self.task, screenshot, self._next_frame_path(), self.frame_max_edge))
+        self._frames.append(_get_pool().submit(
+            _render_frame, screenshot, self._n_steps, goal, self._next_frame_path(), self.frame_max_edge))
+
+    async def finish(self) -> Optional[str]:
+        """Wait for the frames and write the GIF, returns its path or None if there was nothing to render"""
+        try:
+            frame_paths = []
+            for frame in self._frames:
+                try:
+                    frame_paths.append(await asyncio.wrap_future(frame))
+                except BrokenProcessPool as e:
+                    # a dead worker breaks the pool for good, the next run starts a new one
+                    _reset_pool()
+                    logger.warning(f'Could not render GIF frame: {e}')
+                except Exception as e:
+                    logger.warning(f'Could not render GIF frame: {e}')
+            if not frame_paths:
+                logger.warning('No images found in history to create GIF')
+                return None
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(_get_pool(), _assemble_gif, frame_paths, self.output_path, self.duration)
+            logger.info(f'Created GIF at {self.output_path}')
+            return self.output_path
+        finally:
+            shutil.rmtree(self._frame_dir, ignore_errors=True)
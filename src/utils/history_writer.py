@@ -0,0 +1,204 @@
+import asyncio
+import base64
+import copy
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+from browser_use.agent.views import AgentHistory, AgentHistoryList, AgentOutput
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from src.agent.custom_views import CustomAgentHistoryList
+
+logger = logging.getLogger(__name__)
+
+DATA_URL = re.compile(r"^data:image/(\w+);base64,(.*)$", re.DOTALL)
+BLOB_REF = "blob:"
+
+
+def blob_key(screenshot: str) -> str:
+    return hashlib.sha256(screenshot.encode("ascii")).hexdigest()
+
+
+def write_blob(blob_dir: str, key: str, screenshot: str) -> None:
+    blob_path = os.path.join(blob_dir, key)
+    if not os.path.exists(blob_path):
+        os.makedirs(blob_dir, exist_ok=True)
+        with open(blob_path, "wb") as f:
+            f.write(base64.b64decode(screenshot))
+
+
+def load_blob(ref: str, blob_dir: str) -> str:
+    """Base64 content of a "blob:<hash>" reference"""
+    with open(os.path.join(blob_dir, ref[len(BLOB_REF):]), "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii")
+
+
+def _image_parts(message: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    content = message["data"].get("content")
+    if isinstance(content, list):
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                yield part
+
+
+def dump_message(message: BaseMessage, blob: Callable[[str], str]) -> Dict[str, Any]:
+    """Serializable dict of a message, with the base64 images replaced by blob(image)"""
+    data = messages_to_dict([message])[0]
+    for part in _image_parts(data):
+        match = DATA_URL.match(part["image_url"]["url"])
+        if match:
+            part["image_url"]["url"] = f"data:image/{match.group(1)};base64,{blob(match.group(2))}"
+    return data
+
+
+def load_message(data: Dict[str, Any], blob_dir: str) -> BaseMessage:
+    data = copy.deepcopy(data)
+    for part in _image_parts(data):
+        prefix, _, ref = part["image_url"]["url"].partition(";base64,")
+        if ref.startswith(BLOB_REF):
+            part["image_url"]["url"] = f"{prefix};base64,{load_blob(ref, blob_dir)}"
+    return messages_from_dict([data])[0]
+
+
+class HistoryWriter:
+    """
+    Appends the records of a run to one gzip compressed jsonl stream without blocking the event loop.
+    Records are queued and written in batches from a worker thread, screenshots are stored once per
+    content hash in blob_dir and referenced as "blob:<hash>", messages repeated across steps are
+    written once and referenced by id.
+    """
+
+    def __init__(self, path: str, blob_dir: Optional[str] = None):
+        self.path = path
+        self.blob_dir = blob_dir or os.path.join(os.path.dirname(path), "blobs")
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._file: Optional[gzip.GzipFile] = None
+        self._blobs: set[str] = set()
+        self._message_ids: set[str] = set()
+
+    def _blob(self, screenshot: str, pending: List[Tuple[str, str]]) -> str:
+        key = blob_key(screenshot)
+        if key not in self._blobs:
+            self._blobs.add(key)
+            pending.append((key, screenshot))
+        return BLOB_REF + key
+
+    def write(self, record: Dict[str, Any], blobs: Optional[List[Tuple[str, str]]] = None) -> None:
+        """Queue a record, the blobs it references are written before it"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._queue.put_nowait((record, blobs or []))
+
+    def write_history_item(self, item: AgentHistory) -> None:
+        blobs = []
+        data = item.model_dump()
+        if data["state"].get("screenshot"):
+            data["state"]["screenshot"] = self._blob(data["state"]["screenshot"], blobs)
+        self.write({"type": "history", **data}, blobs)
+
+    def write_conversation(self, step: int, input_messages: List[BaseMessage], response: Any) -> None:
+        blobs = []
+        message_ids = []
+        for input_message in input_messages:
+            message = dump_message(input_message, lambda screenshot: self._blob(screenshot, blobs))
+            message_id = hashlib.sha256(json.dumps(message, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+            if message_id not in self._message_ids:
+                self._message_ids.add(message_id)
+                self.write({"type": "message", "id": message_id, "message": message}, blobs)
+                blobs = []
+            message_ids.append(message_id)
+        self.write({
+            "type": "conversation",
+            "step": step,
+            "messages": message_ids,
+            "response": json.loads(response.model_dump_json(exclude_unset=True)) if response else None,
+        }, blobs)
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            # whatever piled up while the previous batch was being written goes in this one
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            closing = batch[-1] is None
+            batch = [entry for entry in batch if entry is not None]
+            try:
+                await asyncio.to_thread(self._write_batch, batch, closing)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} history records to {self.path}: {e}")
+            if closing:
+                return
+
+    def _write_batch(self, batch: List[Tuple[Dict[str, Any], List[Tuple[str, str]]]], closing: bool) -> None:
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = gzip.open(self.path, "ab")
+        for record, blobs in batch:
+            for key, screenshot in blobs:
+                write_blob(self.blob_dir, key, screenshot)
+            self._file.write(json.dumps(record).encode("utf-8") + b"\n")
+        if closing:
+            self._file.close()
+            self._file = None
+        else:
+            # sync flush, everything written so far is readable if the process dies
+            self._file.flush()
+
+    async def close(self) -> None:
+        """Write the queued records and close the stream"""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+
+def archive_run(run_dir: str) -> str:
+    """Zip the stream and blobs of a run folder into <run_dir>.zip and remove the folder, returns the zip path"""
+    archive = shutil.make_archive(run_dir, "zip", run_dir)
+    shutil.rmtree(run_dir)
+    return archive
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Read back the records of a stream, with blob references still in place"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_history(path: str, output_model: Type[AgentOutput], blob_dir: Optional[str] = None) -> AgentHistoryList:
+    """Rebuild the AgentHistoryList of a stream, screenshots are read back from the blobs"""
+    blob_dir = blob_dir or os.path.join(os.path.dirname(path), "blobs")
+    history = []
+    for record in iter_records(path):
+        if record.pop("type") != "history":
+            continue
+        screenshot = record["state"].get("screenshot")
+        if screenshot and screenshot.startswith(BLOB_REF):
+            record["state"]["screenshot"] = load_blob(screenshot, blob_dir)
+        if record["model_output"]:
+            record["model_output"] = output_model.model_validate(record["model_output"])
+        record["state"].setdefault("interacted_element", None)
+        history.append(record)
+    return CustomAgentHistoryList.model_validate({"history": history})
+
+
+def load_conversations(path: str, blob_dir: Optional[str] = None) -> Iterator[Tuple[int, List[BaseMessage], Any]]:
+    """Yield (step, input messages, response) of the conversation records"""
+    blob_dir = blob_dir or os.path.join(os.path.dirname(path), "blobs")
+    messages = {}
+    for record in iter_records(path):
+        if record["type"] == "message":
+            messages[record["id"]] = record["message"]
+        elif record["type"] == "conversation":
+            input_messages = [load_message(messages[message_id], blob_dir) for message_id in record["messages"]]
+            yield record["step"], input_messages, record["response"]
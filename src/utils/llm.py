@@ -67,7 +67,8 @@ class DeepSeekR1ChatOpenAI(ChatOpenAI):
             else:
                 message_history.append({"role": "user", "content": input_.content})
 
-        response = self.client.chat.completions.create(
+        # async_client stays the completions resource that the inherited async paths (astream) rely on
+        response = await self.root_async_client.chat.completions.create(
             model=self.model_name,
             messages=message_history
         )
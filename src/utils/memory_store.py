@@ -0,0 +1,76 @@
+import hashlib
+import math
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+WORD = re.compile(r"\w+")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(WORD.findall(text.lower()))
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+@dataclass
+class MemoryEntry:
+    text: str
+    words: frozenset
+    first_step: int
+    last_step: int
+
+
+class MemoryStore:
+    """
+    Important contents collected by the agent, deduplicated by a hash of their normalized text.
+    Rendering keeps the entries most relevant to the current goal and most recent within a token budget.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, MemoryEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, text: str, step: int) -> bool:
+        """Add an entry, returns False if the same content was already stored"""
+        text = text.strip()
+        normalized = _normalize(text)
+        if not normalized:
+            return False
+        key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.last_step = step
+            return False
+        self._entries[key] = MemoryEntry(text=text, words=frozenset(normalized.split()), first_step=step,
+                                         last_step=step)
+        return True
+
+    def render(self, query: str = "", max_tokens: Optional[int] = None) -> str:
+        """
+        Entries ranked by word overlap with the query and by recency, as many as fit in max_tokens.
+        The kept entries are listed in the order they were found, so progress notes read naturally.
+        """
+        entries = list(self._entries.values())
+        if max_tokens is not None and sum(_estimate_tokens(e.text) for e in entries) > max_tokens:
+            query_words = frozenset(_normalize(query).split())
+            last_step = max(e.last_step for e in entries) or 1
+
+            def score(entry: MemoryEntry) -> float:
+                relevance = len(entry.words & query_words) / math.sqrt(len(entry.words)) if query_words else 0
+                return relevance + entry.last_step / last_step
+
+            kept = set()
+            budget = max_tokens
+            for entry in sorted(entries, key=score, reverse=True):
+                tokens = _estimate_tokens(entry.text)
+                if tokens <= budget:
+                    kept.add(id(entry))
+                    budget -= tokens
+            entries = [e for e in entries if id(e) in kept]
+        return "".join(f"{e.text}\n" for e in entries)
@@ -0,0 +1,145 @@
+import json
+import logging
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from json_repair import repair_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+FENCED_JSON = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+# how many responses each tier of parse_model_json handled
+parse_tier_hits: Counter = Counter()
+
+
+def _strict_loads(text: str) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def parse_model_json(content: str) -> Dict[str, Any]:
+    """
+    Parse the json object of a model response, trying the cheapest tier first:
+    strict parse, then the content of a code fence or the outermost braces, then repair_json.
+    """
+    try:
+        parsed = _strict_loads(content)
+        if isinstance(parsed, dict):
+            parse_tier_hits["strict"] += 1
+            return parsed
+    except ValueError:
+        pass
+
+    match = FENCED_JSON.search(content)
+    if match:
+        candidate = match.group(1)
+    else:
+        start, end = content.find("{"), content.rfind("}")
+        candidate = content[start:end + 1] if 0 <= start < end else None
+    if candidate:
+        try:
+            parsed = _strict_loads(candidate)
+            if isinstance(parsed, dict):
+                parse_tier_hits["extracted"] += 1
+                return parsed
+        except ValueError:
+            pass
+
+    parsed = json.loads(repair_json(content.replace("```json", "").replace("```", "")))
+    if not isinstance(parsed, dict):
+        raise ValueError("Model response is not a json object")
+    parse_tier_hits["repaired"] += 1
+    return parsed
+
+
+class StreamingActionParser:
+    """
+    Incrementally scan a streamed agent response and emit every entry of the top level
+    `action` list as soon as its closing brace arrives, while later tokens are still being generated.
+    """
+
+    def __init__(self, action_key: str = "action"):
+        self.action_key = action_key
+        self.buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._current_key = None
+        self._in_action_list = False
+        self._action_start = None
+        self.n_emitted = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add a chunk of model output and return the actions completed by it"""
+        self.buffer += text
+        completed = []
+
+        if not self._started:
+            # skip reasoning blocks and markdown fences in front of the JSON object
+            if "<think>" in self.buffer and "</think>" not in self.buffer:
+                return completed
+            search_from = self.buffer.find("</think>") + len("</think>") if "</think>" in self.buffer else 0
+            start = self.buffer.find("{", search_from)
+            if start == -1:
+                return completed
+            self._started = True
+            self._pos = start
+
+        buffer = self.buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = buffer[self._string_start + 1:self._pos]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char == ":" and self._depth == 1:
+                self._current_key = self._last_string
+            elif char in "{[":
+                if char == "[" and self._depth == 1 and self._current_key == self.action_key:
+                    self._in_action_list = True
+                elif char == "{" and self._depth == 2 and self._in_action_list:
+                    self._action_start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if char == "}" and self._depth == 2 and self._action_start is not None:
+                    action = self._load(buffer[self._action_start:self._pos + 1])
+                    self._action_start = None
+                    if action is not None:
+                        completed.append(action)
+                        self.n_emitted += 1
+                elif char == "]" and self._depth == 1 and self._in_action_list:
+                    self._in_action_list = False
+            self._pos += 1
+        return completed
+
+    @staticmethod
+    def _load(text: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                return json.loads(repair_json(text))
+            except Exception as e:
+                logger.debug(f"Could not parse streamed action {text}: {e}")
+                return None
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an openai / anthropic / google api error, if any"""
+    for status in (
+            getattr(error, "status_code", None),
+            getattr(getattr(error, "response", None), "status_code", None),
+            getattr(error, "code", None),
+    ):
+        try:
+            if status is not None:
+                return int(status)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait from the Retry-After header of the error response"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return _status_code(error) == 429 or type(error).__name__ in ("RateLimitError", "ResourceExhausted")
+
+
+def _is_transient(error: Exception) -> bool:
+    status = _status_code(error)
+    return (status is not None and 500 <= status < 600) \
+        or isinstance(error, (ConnectionError, asyncio.TimeoutError)) \
+        or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class RetryScheduler:
+    """
+    Decides how long to wait before retrying a failed step from the type of error:
+    rate limits honor Retry-After, or back off exponentially from rate_limit_delay without it,
+    server and connection errors back off exponentially with jitter,
+    anything else (e.g. unparsable output) is retried right away.
+    A rate limit blocks every agent sharing the scheduler until it expires.
+    """
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 60.0, rate_limit_delay: float = 10.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # the fixed retry_delay agents used to wait on every rate limit
+        self.rate_limit_delay = rate_limit_delay
+        self._blocked_until = 0.0
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter, so agents failing together don't retry together
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def get_delay(self, error: Exception, attempt: int) -> float:
+        if _is_rate_limit(error):
+            retry_after = _retry_after(error)
+            if retry_after is not None:
+                return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+            return min(self.max_delay, self.rate_limit_delay * 2 ** attempt) + random.uniform(0, self.base_delay)
+        if _is_transient(error):
+            return self._backoff(attempt)
+        return 0.0
+
+    async def wait_before_retry(self, error: Exception, attempt: int) -> None:
+        delay = self.get_delay(error, attempt)
+        if delay <= 0:
+            return
+        if _is_rate_limit(error):
+            self._blocked_until = max(self._blocked_until, time.time() + delay)
+            logger.warning(f"⏳ Rate limited, holding requests for {delay:.1f}s")
+        else:
+            logger.info(f"⏳ Retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    async def wait_if_throttled(self) -> None:
+        """Wait until a rate limit reported by any agent sharing this scheduler expired"""
+        delay = self._blocked_until - time.time()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            # another agent can have been rate limited in the meantime
+            delay = self._blocked_until - time.time()
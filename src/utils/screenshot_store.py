@@ -0,0 +1,55 @@
+import os
+from typing import Optional
+
+from browser_use.browser.views import BrowserStateHistory
+
+from src.utils.history_writer import BLOB_REF, blob_key, load_blob, write_blob
+
+
+class ScreenshotStore:
+    """Screenshots on disk, one file per content hash, read back on every access"""
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def put(self, screenshot: str) -> str:
+        key = blob_key(screenshot)
+        write_blob(self.store_dir, key, screenshot)
+        return key
+
+    def get(self, key: str) -> str:
+        return load_blob(BLOB_REF + key, self.store_dir)
+
+
+class SpilledBrowserStateHistory(BrowserStateHistory):
+    """
+    BrowserStateHistory that keeps only the key of its screenshot in memory. The screenshot is written
+    to the store when set and loaded when read, so GIF rendering and history export work unchanged.
+    """
+
+    def __init__(self, *args, store: ScreenshotStore, **kwargs):
+        self._store = store
+        self._screenshot_key: Optional[str] = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def screenshot(self) -> Optional[str]:
+        return self._store.get(self._screenshot_key) if self._screenshot_key else None
+
+    @screenshot.setter
+    def screenshot(self, screenshot: Optional[str]) -> None:
+        self._screenshot_key = self._store.put(screenshot) if screenshot else None
+
+    @classmethod
+    def spill(cls, state: BrowserStateHistory, store: ScreenshotStore) -> "SpilledBrowserStateHistory":
+        if isinstance(state, cls):
+            return state
+        return cls(
+            url=state.url,
+            title=state.title,
+            tabs=state.tabs,
+            interacted_element=state.interacted_element,
+            screenshot=state.screenshot,
+            store=store,
+        )
@@ -0,0 +1,54 @@
+import base64
+import io
+from typing import Optional, Tuple
+
+from PIL import Image
+
+FINGERPRINT_SIZE = (160, 90)
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+
+def prepare_screenshot(
+        screenshot: str,
+        max_edge: Optional[int] = None,
+        image_format: str = "png",
+        quality: int = 75,
+) -> Tuple[str, str]:
+    """
+    Downscale a base64 screenshot so that its longest edge is at most max_edge and re-encode it.
+    Returns the base64 data and its mime type.
+    """
+    image = Image.open(io.BytesIO(base64.b64decode(screenshot)))
+    if max_edge and max(image.size) > max_edge:
+        scale = max_edge / max(image.size)
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.Resampling.LANCZOS,
+        )
+
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(buffer, format=image_format.upper(), quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8"), MIME_TYPES[image_format]
+
+
+def screenshot_fingerprint(screenshot: str) -> bytes:
+    """Small grayscale thumbnail of a base64 screenshot, used to detect visually identical pages"""
+    image = Image.open(io.BytesIO(base64.b64decode(screenshot)))
+    return image.convert("L").resize(FINGERPRINT_SIZE, Image.Resampling.BOX).tobytes()
+
+
+def fingerprint_distance(a: bytes, b: bytes, tolerance: int = 16) -> int:
+    """Number of thumbnail pixels whose gray level differs by more than the tolerance"""
+    if len(a) != len(b):
+        return max(len(a), len(b))
+    return sum(1 for x, y in zip(a, b) if abs(x - y) > tolerance)
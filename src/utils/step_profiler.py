@@ -0,0 +1,73 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import List
+
+from browser_use.agent.views import AgentHistoryList
+
+
+class StepProfiler:
+    """Records the wall time of the named phases of an agent step"""
+
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append({"name": name, "start_time": start_time, "end_time": time.time()})
+
+
+def _profiled_steps(history: AgentHistoryList) -> List:
+    return [h.metadata for h in history.history if h.metadata is not None]
+
+
+def write_timings_jsonl(history: AgentHistoryList, path: str) -> None:
+    """One json line per step with its duration and the duration of each phase, in seconds"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for metadata in _profiled_steps(history):
+            phases = {}
+            for phase in getattr(metadata, "phases", []):
+                phases[phase["name"]] = phases.get(phase["name"], 0) + phase["end_time"] - phase["start_time"]
+            f.write(json.dumps({
+                "step": metadata.step_number,
+                "start_time": metadata.step_start_time,
+                "duration": metadata.duration_seconds,
+                "input_tokens": metadata.input_tokens,
+                "phases": phases,
+            }) + "\n")
+
+
+def write_chrome_trace(history: AgentHistoryList, path: str) -> None:
+    """Steps and their phases as complete events of the chrome trace format (chrome://tracing, Perfetto)"""
+    events = []
+    for metadata in _profiled_steps(history):
+        events.append({
+            "name": f"step {metadata.step_number}",
+            "cat": "step",
+            "ph": "X",
+            "ts": metadata.step_start_time * 1e6,
+            "dur": metadata.duration_seconds * 1e6,
+            "pid": 1,
+            "tid": 1,
+            "args": {"input_tokens": metadata.input_tokens},
+        })
+        for phase in getattr(metadata, "phases", []):
+            events.append({
+                "name": phase["name"],
+                "cat": "phase",
+                "ph": "X",
+                "ts": phase["start_time"] * 1e6,
+                "dur": (phase["end_time"] - phase["start_time"]) * 1e6,
+                "pid": 1,
+                "tid": 1,
+                "args": {"step": metadata.step_number},
+            })
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
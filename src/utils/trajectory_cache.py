@@ -0,0 +1,62 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Optional, Type
+from urllib.parse import urlsplit, urlunsplit
+
+from browser_use.agent.views import AgentHistoryList, AgentOutput
+
+from src.agent.custom_views import CustomAgentHistoryList
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_task(task: str) -> str:
+    return re.sub(r"\s+", " ", task).strip().lower()
+
+
+def normalize_url(url: str) -> str:
+    """Drop the fragment and trailing slash, lowercase scheme and host"""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+class TrajectoryCache:
+    """
+    Successful action trajectories stored on disk, one json file per (task, start url) pair.
+    Screenshots are dropped, only what is needed to replay the actions is kept.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, task: str, start_url: str) -> str:
+        key = hashlib.sha256(f"{normalize_task(task)}\n{normalize_url(start_url)}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, task: str, start_url: str, output_model: Type[AgentOutput]) -> Optional[AgentHistoryList]:
+        path = self._path(task, start_url)
+        if not os.path.exists(path):
+            return None
+        try:
+            return CustomAgentHistoryList.load_from_file(path, output_model)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cached trajectory {path}: {e}")
+            return None
+
+    def put(self, task: str, start_url: str, history: AgentHistoryList) -> None:
+        if not history.is_successful():
+            return
+        data = history.model_dump()
+        for item in data["history"]:
+            item["state"]["screenshot"] = None
+        path = self._path(task, start_url)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        logger.debug(f"Cached trajectory of {len(data['history'])} steps to {path}")
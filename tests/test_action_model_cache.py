@@ -0,0 +1,35 @@
+import sys
+import time
+
+sys.path.append(".")
+
+
+def test_action_model_cache(n_agents: int = 20):
+    from browser_use.controller.service import Controller
+
+    from src.agent.custom_agent import CustomAgent
+    from src.agent.custom_views import CustomAgentOutput
+
+    controller = Controller()
+
+    start = time.perf_counter()
+    for _ in range(n_agents):
+        action_model = controller.registry.create_action_model()
+        CustomAgentOutput.type_with_custom_actions(action_model)
+    uncached = time.perf_counter() - start
+
+    agents = [CustomAgent.__new__(CustomAgent) for _ in range(n_agents)]
+    start = time.perf_counter()
+    for agent in agents:
+        agent.controller = controller
+        agent._setup_action_models()
+    cached = time.perf_counter() - start
+
+    print(f"{n_agents} agents: action models built every time {uncached * 1000:.1f}ms, "
+          f"cached {cached * 1000:.1f}ms")
+    assert all(agent.AgentOutput is agents[0].AgentOutput for agent in agents)
+    assert agents[0].AgentOutput.model_fields["action"].annotation == list[agents[0].ActionModel]
+
+
+if __name__ == "__main__":
+    test_action_model_cache()
@@ -0,0 +1,76 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_vision_trigger():
+    from browser_use.agent.views import ActionResult
+    from browser_use.controller.service import Controller
+    from browser_use.dom.history_tree_processor.view import Coordinates, CoordinateSet
+    from browser_use.dom.views import DOMElementNode
+
+    from src.utils.adaptive_vision import VisionTrigger, with_request_screenshot
+
+    def page(*tags, is_visible=True, size=None):
+        coordinates = None
+        if size:
+            corner = Coordinates(x=0, y=0)
+            coordinates = CoordinateSet(top_left=corner, top_right=corner, bottom_left=corner, bottom_right=corner,
+                                        center=corner, width=size[0], height=size[1])
+        children = [DOMElementNode(is_visible=is_visible, parent=None, tag_name=tag, xpath=tag, attributes={},
+                                   children=[], page_coordinates=coordinates)
+                    for tag in tags]
+        return DOMElementNode(is_visible=True, parent=None, tag_name="body", xpath="body", attributes={},
+                              children=children)
+
+    shared_controller = Controller()
+    controller = with_request_screenshot(shared_controller)
+    # the caller's controller is left as it was, copies share the same registered action
+    assert "request_screenshot" not in shared_controller.registry.registry.actions
+    assert with_request_screenshot(shared_controller).registry.registry.actions["request_screenshot"] is \
+           controller.registry.registry.actions["request_screenshot"]
+
+    action_model = controller.registry.create_action_model()
+    click = [action_model.model_validate({"click_element": {"index": 1}})]
+    ok = [ActionResult()]
+
+    trigger = VisionTrigger()
+    assert trigger.reason("https://example.com/", page("div"), None, None) == "first step on this url"
+    assert trigger.reason("https://example.com#top", page("div"), ok, click) is None
+    assert trigger.reason("https://example.com", page("div"), [ActionResult(error="not found")], click) == \
+           "the previous action failed"
+    assert trigger.reason("https://example.com", page("div"), ok,
+                          [action_model.model_validate({"request_screenshot": {}})]) == "requested by the model"
+    assert trigger.reason("https://example.com", page("div", "canvas"), ok, click) == "canvas or iframe content"
+    assert trigger.reason("https://example.com", page("iframe", size=(640, 360)), ok, click) == \
+           "canvas or iframe content"
+    # hidden frames, tracking pixels and captcha badges are not worth a screenshot
+    assert trigger.reason("https://example.com", page("iframe", is_visible=False), ok, click) is None
+    assert trigger.reason("https://example.com", page("iframe", "iframe", size=(256, 60)), ok, click) is None
+    assert trigger.reason("https://example.com/cart", page("div"), ok, click) == "first step on this url"
+
+
+
+def test_request_screenshot_needs_vision():
+    import os
+
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+    from browser_use.controller.service import Controller
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from src.agent.custom_agent import CustomAgent
+
+    def agent(use_vision):
+        return CustomAgent(task="Open example.com", llm=FakeListChatModel(responses=["{}"]), controller=Controller(),
+                           use_vision=use_vision, adaptive_vision=True)
+
+    with_vision = agent(True)
+    assert "request_screenshot" in with_vision.controller.registry.registry.actions
+    without_vision = agent(False)
+    assert "request_screenshot" not in without_vision.controller.registry.registry.actions
+    assert without_vision.vision_trigger is None
+
+
+if __name__ == "__main__":
+    test_vision_trigger()
+    test_request_screenshot_needs_vision()
@@ -0,0 +1,96 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_agent_checkpoint(tmp_path):
+    import asyncio
+    import base64
+    import os
+
+    from browser_use.agent.message_manager.views import MessageMetadata
+    from browser_use.agent.views import ActionResult, AgentHistory
+    from browser_use.browser.views import BrowserStateHistory
+    from browser_use.controller.service import Controller
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+    from src.agent.custom_views import CustomAgentOutput, CustomAgentState
+    from src.utils.agent_checkpoint import AgentCheckpointer, load_checkpoint
+
+    action_model = Controller().registry.create_action_model()
+    output_model = CustomAgentOutput.type_with_custom_actions(action_model)
+    screenshot = base64.b64encode(os.urandom(3000)).decode()
+
+    def take_step(state, step):
+        model_output = output_model.model_validate({
+            "current_state": {
+                "evaluation_previous_goal": "Success",
+                "important_contents": f"note {step}",
+                "thought": "",
+                "next_goal": f"goal {step}",
+            },
+            "action": [{"go_to_url": {"url": f"https://example.com/{step}"}}],
+        })
+        state.n_steps += 1
+        state.last_action = model_output.action
+        state.last_result = [ActionResult(extracted_content=f"step {step}")]
+        state.history.history.append(AgentHistory(
+            model_output=model_output,
+            result=state.last_result,
+            state=BrowserStateHistory(url=f"https://example.com/{step}", title="", tabs=[], interacted_element=[None],
+                                      screenshot=screenshot),
+        ))
+        state.message_manager_state.history.add_message(
+            HumanMessage(content=[{"type": "text", "text": f"state {step}"},
+                                  {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{screenshot}"}}]),
+            MessageMetadata(tokens=10))
+        state.message_manager_state.history.add_message(AIMessage(content=f"step {step}"), MessageMetadata(tokens=5))
+        state.extracted_pages.add(f"page {step}")
+
+    state = CustomAgentState()
+    state.message_manager_state.history.add_message(SystemMessage(content="system"), MessageMetadata(tokens=1))
+    checkpointer = AgentCheckpointer(tmp_path, state.agent_id)
+
+    async def run_steps():
+        for step in range(1, 4):
+            take_step(state, step)
+            await checkpointer.save(state)
+        # a message swapped in place after it was checkpointed is written again
+        history = state.message_manager_state.history
+        history.replace_message(history.messages[2].message, AIMessage(content="step 1, summarized"), 3)
+        await checkpointer.save(state)
+
+    asyncio.run(run_steps())
+    # each checkpoint only holds the new messages
+    with open(checkpointer.path, encoding="utf-8") as f:
+        f.readline()
+        second = f.readline()
+    assert second.count("state 1") == 0 and second.count("state 2") == 1
+    assert len(os.listdir(checkpointer.blob_dir)) == 1
+
+    # the process died while writing a checkpoint
+    with open(checkpointer.path, "a", encoding="utf-8") as f:
+        f.write('{"agent_id": ')
+
+    restored = load_checkpoint(checkpointer.path, output_model)
+    assert restored.agent_id == state.agent_id
+    assert restored.n_steps == state.n_steps == 4
+    assert [h.model_dump() for h in restored.history.history] == [h.model_dump() for h in state.history.history]
+    assert [m.message for m in restored.message_manager_state.history.messages] == \
+           [m.message for m in state.message_manager_state.history.messages]
+    assert restored.message_manager_state.history.messages[2].message.content == "step 1, summarized"
+    assert [m.metadata.tokens for m in restored.message_manager_state.history.messages] == \
+           [m.metadata.tokens for m in state.message_manager_state.history.messages]
+    assert restored.message_manager_state.history.current_tokens == state.message_manager_state.history.current_tokens
+    assert restored.last_action[0].model_dump(exclude_none=True) == {"go_to_url": {"url": "https://example.com/3"}}
+    assert restored.extracted_pages.render() == state.extracted_pages.render()
+
+    # a finished run leaves nothing behind
+    checkpointer.remove()
+    assert not os.path.exists(checkpointer.path) and not os.path.exists(checkpointer.blob_dir)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_agent_checkpoint(tempfile.mkdtemp())
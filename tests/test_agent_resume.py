@@ -0,0 +1,128 @@
+import os
+import sys
+
+sys.path.append(".")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+
+def _browser_context():
+    """Stand-in for a BrowserContext that always shows the same page"""
+    from types import SimpleNamespace
+
+    from browser_use.browser.views import BrowserState
+    from browser_use.dom.views import DOMElementNode
+
+    async def get_state():
+        return BrowserState(
+            element_tree=DOMElementNode(is_visible=True, parent=None, tag_name="body", xpath="body", attributes={},
+                                        children=[]),
+            selector_map={},
+            url="https://example.com",
+            title="Example",
+            tabs=[],
+        )
+
+    async def get_selector_map():
+        return {}
+
+    async def remove_highlights():
+        pass
+
+    return SimpleNamespace(get_state=get_state, get_selector_map=get_selector_map,
+                           remove_highlights=remove_highlights, config=SimpleNamespace(wait_between_actions=0))
+
+
+def _note_taker(notes, **kwargs):
+    """Settings of an agent whose every step writes down a note"""
+    from browser_use.agent.views import ActionResult
+    from browser_use.controller.service import Controller
+
+    from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+
+    controller = Controller()
+
+    @controller.registry.action("Write down a note")
+    async def note(text: str):
+        notes.append(text)
+        return ActionResult(extracted_content=f"noted {text}", include_in_memory=True)
+
+    return dict(
+        task="Take notes",
+        controller=controller,
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=CustomAgentMessagePrompt,
+        browser_context=_browser_context(),
+        message_context="Notes are numbered",
+        **kwargs,
+    )
+
+
+def _responses(*steps):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    return FakeListChatModel(responses=[
+        '{"current_state": {"evaluation_previous_goal": "Success", "important_contents": "note %d", '
+        '"thought": "", "next_goal": "goal %d"}, "action": [{"note": {"text": "%d"}}]}' % (step, step, step)
+        for step in steps
+    ])
+
+
+def _count_messages(agent, header):
+    return sum(str(m.message.content).startswith(header) for m in agent.message_manager.state.history.messages)
+
+
+def test_resume_with_history_compaction(tmp_path):
+    import asyncio
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from src.agent.custom_agent import CustomAgent
+
+    notes = []
+    # the system prompt and one step fit, earlier steps are summarized
+    settings = _note_taker(notes, max_input_tokens=2500, compaction_llm=FakeListChatModel(responses=["the summary"]))
+    agent = CustomAgent(llm=_responses(1, 2, 3), checkpoint_dir=str(tmp_path), **settings)
+    asyncio.run(agent.run(max_steps=3))
+    assert notes == ["1", "2", "3"]
+
+    resumed = CustomAgent.from_checkpoint(agent.checkpointer.path, llm=_responses(4), initial_actions=None,
+                                          **settings)
+    assert resumed.message_manager.context_content == agent.message_manager.context_content
+    assert resumed.message_manager._prefix_len == agent.message_manager._prefix_len
+    assert resumed.message_manager.history_summary == agent.message_manager.history_summary == "the summary"
+    # the phase timings of the restored steps are kept
+    assert [h.metadata.phases for h in resumed.state.history.history] == \
+           [h.metadata.phases for h in agent.state.history.history]
+    assert all(h.metadata.phases for h in resumed.state.history.history)
+
+    asyncio.run(resumed.run(max_steps=4))
+    assert notes == ["1", "2", "3", "4"]
+    assert resumed.state.n_steps == 5
+    # the summary is replaced, never added twice
+    assert _count_messages(resumed, "Summary of the earlier steps") == 1
+
+
+def test_resume_with_dom_diff(tmp_path):
+    import asyncio
+
+    from src.agent.custom_agent import CustomAgent
+
+    notes = []
+    settings = _note_taker(notes, use_dom_diff=True)
+    agent = CustomAgent(llm=_responses(1), checkpoint_dir=str(tmp_path), **settings)
+    asyncio.run(agent.run(max_steps=1))
+    assert _count_messages(agent, "Full listing of interactive elements") == 1
+
+    resumed = CustomAgent.from_checkpoint(agent.checkpointer.path, llm=_responses(2), initial_actions=None,
+                                          **settings)
+    asyncio.run(resumed.run(max_steps=2))
+    assert notes == ["1", "2"]
+    # the listing of the first run is resent in its place
+    assert _count_messages(resumed, "Full listing of interactive elements") == 1
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_resume_with_history_compaction(tempfile.mkdtemp())
+    test_resume_with_dom_diff(tempfile.mkdtemp())
@@ -0,0 +1,98 @@
+import sys
+
+sys.path.append(".")
+
+INCLUDE_ATTRIBUTES = ['title', 'type', 'name', 'role', 'aria-label', 'placeholder', 'value', 'alt', 'aria-expanded',
+                      'data-date-format']
+
+
+def _element(tag, attributes=None, children=(), index=None):
+    from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+    node = DOMElementNode(is_visible=True, parent=None, tag_name=tag, xpath=f"{tag}[{index}]",
+                          attributes=attributes or {}, children=[], highlight_index=index)
+    for child in children:
+        if isinstance(child, str):
+            child = DOMTextNode(is_visible=True, parent=None, text=child)
+        child.parent = node
+        node.children.append(child)
+    return node
+
+
+def _product_page(n_products=40):
+    """Shop listing like page: navigation, search form, product cards and pagination"""
+    index = iter(range(10_000))
+    nav = _element("nav", children=[
+        _element("a", {"role": "link", "title": title}, [title], next(index))
+        for title in ["Home", "Deals", "Laptops", "Phones", "Help"]
+    ])
+    search = _element("form", children=[
+        _element("input", {"type": "text", "name": "q", "placeholder": "Search products", "aria-label": "Search"},
+                 index=next(index)),
+        _element("button", {"type": "submit", "aria-label": "Search"}, ["Search"], next(index)),
+    ])
+    cards = []
+    for i in range(n_products):
+        name = f"Laptop model {i} 16GB RAM 512GB SSD"
+        cards.append(_element("div", children=[
+            _element("a", {"title": name, "role": "link"}, [name], next(index)),
+            _element("img", {"alt": name, "role": "img"}, index=next(index)),
+            f"${400 + i}.99",
+            _element("button", {"type": "button", "aria-label": f"Add {name} to cart", "role": "button"},
+                     ["Add to cart"], next(index)),
+        ]))
+    pages = _element("nav", children=[
+        _element("a", {"aria-label": f"Page {i}", "role": "link"}, [str(i)], next(index)) for i in range(1, 11)
+    ])
+    return _element("body", children=[nav, search, *cards, pages])
+
+
+def test_compact_elements():
+    from src.utils.compact_dom import compact_elements_to_string
+    from src.utils.dom_diff import split_element_entries
+
+    page = _element("body", children=[
+        _element("input", {"type": "text", "placeholder": "Email", "name": "email"}, index=0),
+        _element("button", {"type": "submit", "role": "button"}, ["Sign in"], 1),
+        "Popular",
+        *[_element("a", {"role": "link"}, [f"Item {i}"], i) for i in range(2, 6)],
+    ])
+    listing = compact_elements_to_string(page, INCLUDE_ATTRIBUTES)
+    assert listing.split("\n") == [
+        "[0]<input n=email p=Email>",
+        "[1]<button ty=submit>Sign in",
+        "Popular",
+        "<a>x4: [2]Item 2 | [3]Item 3 | [4]Item 4 | [5]Item 5",
+    ]
+    # one entry per element for dom diff and ranking
+    assert len(split_element_entries(compact_elements_to_string(page, INCLUDE_ATTRIBUTES, group_siblings=False),
+                                     {})) == 6
+
+
+def benchmark_compact_elements():
+    from src.utils.compact_dom import compact_elements_to_string
+
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+
+        def count_tokens(text):
+            return len(encoding.encode(text))
+    except Exception:
+        # tiktoken missing or its encoding can't be downloaded
+        def count_tokens(text):
+            return len(text) // 4
+
+    for n_products in (10, 40, 200):
+        page = _product_page(n_products)
+        default = count_tokens(page.clickable_elements_to_string(include_attributes=INCLUDE_ATTRIBUTES))
+        compact = count_tokens(compact_elements_to_string(page, INCLUDE_ATTRIBUTES))
+        ungrouped = count_tokens(compact_elements_to_string(page, INCLUDE_ATTRIBUTES, group_siblings=False))
+        print(f"{n_products} products: {default} tokens, compact {compact} ({compact / default:.0%}), "
+              f"compact without grouping {ungrouped} ({ungrouped / default:.0%})")
+        assert compact < default
+
+
+if __name__ == "__main__":
+    test_compact_elements()
+    benchmark_compact_elements()
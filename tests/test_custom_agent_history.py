@@ -0,0 +1,87 @@
+import os
+import sys
+
+sys.path.append(".")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+
+def test_make_history_item(tmp_path):
+    import base64
+
+    from browser_use.agent.views import ActionResult
+    from browser_use.browser.views import BrowserState
+    from browser_use.controller.service import Controller
+    from browser_use.dom.views import DOMElementNode
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from src.agent.custom_agent import CustomAgent
+
+    agent = CustomAgent(task="Open example.com", llm=FakeListChatModel(responses=["{}"]), controller=Controller(),
+                        screenshot_store_dir=str(tmp_path))
+    screenshot = base64.b64encode(os.urandom(3000)).decode()
+    state = BrowserState(
+        element_tree=DOMElementNode(is_visible=True, parent=None, tag_name="body", xpath="body", attributes={},
+                                    children=[]),
+        selector_map={},
+        url="https://example.com",
+        title="Example",
+        tabs=[],
+        screenshot=screenshot,
+    )
+    for _ in range(2):
+        agent._make_history_item(None, state, [ActionResult(extracted_content="ok")])
+
+    assert len(agent.state.history.history) == 2
+    assert agent.state.history.history[-1].state.screenshot == screenshot
+    assert agent.state.history.history[-1].result[0].extracted_content == "ok"
+
+
+def test_streamed_actions_kept_on_parse_error():
+    import asyncio
+    from types import SimpleNamespace
+
+    from browser_use.agent.views import ActionResult
+    from browser_use.controller.service import Controller
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.messages import HumanMessage
+
+    from src.agent.custom_agent import CustomAgent, StreamedActionsError
+
+    controller = Controller()
+    notes = []
+
+    @controller.registry.action("Write down a note")
+    async def note(text: str):
+        notes.append(text)
+        return ActionResult(extracted_content=f"noted {text}")
+
+    async def get_selector_map():
+        return {}
+
+    async def remove_highlights():
+        pass
+
+    browser_context = SimpleNamespace(get_selector_map=get_selector_map, remove_highlights=remove_highlights,
+                                      config=SimpleNamespace(wait_between_actions=0))
+    # the first action is complete, the response is cut off in the second one
+    response = '{"current_state": {"evaluation_previous_goal": "", "important_contents": "", "thought": "", ' \
+               '"next_goal": ""}, "action": [{"note": {"text": "a"}}, {"note": {"te'
+    agent = CustomAgent(task="Take notes", llm=FakeListChatModel(responses=[response]), controller=controller,
+                        browser_context=browser_context, stream_actions=True)
+
+    async def next_action():
+        try:
+            await agent.get_next_action_streaming([HumanMessage(content="take notes")])
+        except StreamedActionsError as e:
+            return e.results
+
+    results = asyncio.run(next_action())
+    assert notes == ["a"]
+    assert [r.extracted_content for r in results] == ["noted a"]
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_make_history_item(tempfile.mkdtemp())
+    test_streamed_actions_kept_on_parse_error()
@@ -0,0 +1,98 @@
+import sys
+
+sys.path.append(".")
+
+
+def _manager(**settings):
+    from langchain_core.messages import SystemMessage
+
+    from src.agent.custom_message_manager import CustomMessageManager, CustomMessageManagerSettings
+    from src.agent.custom_views import CustomMessageManagerState
+
+    return CustomMessageManager(task="Open example.com", system_message=SystemMessage(content="system"),
+                                settings=CustomMessageManagerSettings(**settings), state=CustomMessageManagerState())
+
+
+def _assert_tokens_consistent(manager):
+    history = manager.state.history
+    assert history.current_tokens == sum(m.metadata.tokens for m in history.messages)
+    for managed_message in history.messages:
+        assert managed_message.metadata.tokens == manager._count_tokens(managed_message.message)
+
+
+def test_age_images():
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    manager = _manager(keep_last_images=2, image_tokens=800)
+    for step in range(1, 5):
+        manager._add_state_message(HumanMessage(content=[
+            {"type": "text", "text": f"state {step}"},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,iVBORw0KGgo="}},
+        ]))
+        manager._add_message_with_tokens(AIMessage(content=f"step {step}"))
+        _assert_tokens_consistent(manager)
+
+    states = [m.message for m in manager.state.history.messages if isinstance(m.message, HumanMessage)]
+    with_images = [any(item.get("type") == "image_url" for item in m.content) for m in states]
+    assert with_images == [False, False, True, True]
+    # the text of an aged state message is kept, the image is replaced by a note and its tokens given back
+    assert states[0].content[0]["text"] == "state 1"
+    assert "removed" in states[0].content[-1]["text"]
+    assert manager.state.history.current_tokens < 4 * 800
+
+
+
+def test_history_compaction():
+    from langchain_core.messages import AIMessage
+
+    manager = _manager(message_context="Use the shop search", compact_history=True, max_input_tokens=90)
+    prefix = [m.message for m in manager.state.history.messages]
+    assert len(prefix) == 2
+
+    def take_steps(first, last):
+        for step in range(first, last + 1):
+            manager._add_message_with_tokens(AIMessage(content=f"step {step} " + "x" * 80))
+        manager.cut_messages()
+        return manager.pop_evicted_messages()
+
+    evicted = take_steps(1, 4)
+    assert [m.content.split()[1] for m in evicted] == ["1", "2"]
+    manager.set_history_summary("steps 1 to 2")
+    _assert_tokens_consistent(manager)
+
+    evicted = take_steps(5, 6)
+    # the prefix and the summary stay in place, the oldest steps after them are cut
+    assert [m.content.split()[1] for m in evicted] == ["3", "4", "5"]
+    manager.set_history_summary("steps 1 to 5")
+    messages = [m.message for m in manager.state.history.messages]
+    assert messages[:2] == prefix
+    assert messages[2].content.endswith("steps 1 to 5")
+    assert [m.content.split()[1] for m in messages[3:]] == ["6"]
+    assert sum("Summary of the earlier steps" in str(m.content) for m in messages) == 1
+    _assert_tokens_consistent(manager)
+    assert manager.state.history.current_tokens <= 90
+
+
+def test_compact_history_merges_summary():
+    import asyncio
+    import os
+
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+    from browser_use.controller.service import Controller
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.messages import AIMessage
+
+    from src.agent.custom_agent import CustomAgent
+
+    compaction_llm = FakeListChatModel(responses=["<think>merging</think> searched for laptops"])
+    agent = CustomAgent(task="Buy a laptop", llm=FakeListChatModel(responses=["{}"]), controller=Controller(),
+                        compaction_llm=compaction_llm)
+    asyncio.run(agent._compact_history([AIMessage(content="step 1")]))
+    assert agent.message_manager.history_summary == "searched for laptops"
+    assert agent.message_manager.get_messages()[1].content.endswith("searched for laptops")
+
+
+if __name__ == "__main__":
+    test_age_images()
+    test_history_compaction()
+    test_compact_history_merges_summary()
@@ -0,0 +1,105 @@
+import sys
+
+sys.path.append(".")
+
+
+def _page(url, elements):
+    """Browser state like object listing the (xpath, html) elements with indexes in page order"""
+    from types import SimpleNamespace
+
+    listing = "\n".join(f"[{i}]{html}" for i, (_, html) in enumerate(elements))
+    return SimpleNamespace(
+        url=url,
+        selector_map={i: SimpleNamespace(xpath=xpath) for i, (xpath, _) in enumerate(elements)},
+        element_tree=SimpleNamespace(clickable_elements_to_string=lambda include_attributes=None: listing),
+        pixels_above=0,
+        pixels_below=0,
+    ), listing
+
+
+def test_split_and_diff_element_entries():
+    from types import SimpleNamespace
+
+    from src.utils.dom_diff import diff_element_entries, split_element_entries
+
+    text = "intro text\n[0]<a>Home</a>\nWelcome back\n[1]<button>Buy</button>\n[2]<a>Help</a>"
+    selector_map = {0: SimpleNamespace(xpath="nav/a[1]"), 1: SimpleNamespace(xpath="main/button")}
+    entries = split_element_entries(text, selector_map)
+    # plain text stays with the element it follows, unknown indexes are keyed by index
+    assert entries == {
+        "": "intro text",
+        "nav/a[1]": "[0]<a>Home</a>\nWelcome back",
+        "main/button": "[1]<button>Buy</button>",
+        "index:2": "[2]<a>Help</a>",
+    }
+    # the same xpath in two frames gets two entries
+    frames = split_element_entries("[0]<a>Home</a>\n[1]<a>Home</a>", {0: selector_map[0], 1: selector_map[0]})
+    assert list(frames) == ["nav/a[1]", "nav/a[1]'"]
+
+    # a banner inserted at the top shifts every index, elements are still matched by xpath
+    old_page, old_listing = _page("https://shop.test", [("nav/a", "<a>Home</a>"), ("main/button", "<button>Buy</button>"),
+                                                        ("footer/a", "<a>Help</a>")])
+    new_page, new_listing = _page("https://shop.test", [("header/div", "<div>Sale</div>"), ("nav/a", "<a>Home</a>"),
+                                                        ("main/button", "<button>Buy</button>")])
+    diff = diff_element_entries(split_element_entries(old_listing, old_page.selector_map),
+                                split_element_entries(new_listing, new_page.selector_map))
+    assert diff.split("\n") == [
+        "+ [0]<div>Sale</div>",
+        "~ [1]<a>Home</a>",
+        "~ [2]<button>Buy</button>",
+        "- [2]<a>Help</a>",
+    ]
+    assert diff_element_entries(split_element_entries(new_listing, new_page.selector_map),
+                                split_element_entries(new_listing, new_page.selector_map)) == ""
+
+
+def test_dom_diff_resync():
+    from langchain_core.messages import SystemMessage
+
+    from src.agent.custom_message_manager import CustomMessageManager, CustomMessageManagerSettings
+    from src.agent.custom_views import CustomMessageManagerState
+
+    manager = CustomMessageManager(
+        task="Buy a laptop",
+        system_message=SystemMessage(content="system"),
+        settings=CustomMessageManagerSettings(use_dom_diff=True, dom_diff_resync_interval=3),
+        state=CustomMessageManagerState(),
+    )
+    elements = [(f"main/a[{i}]", f"<a>Laptop {i}</a>") for i in range(20)]
+    full = "See the full listing of interactive elements above."
+    unchanged = "No changes since the full listing of interactive elements above."
+
+    def elements_text(url, page_elements):
+        return manager._get_dom_diff_elements_text(_page(url, page_elements)[0])
+
+    def full_listings():
+        return [m.message.content for m in manager.state.history.messages
+                if str(m.message.content).startswith("Full listing")]
+
+    assert elements_text("https://shop.test", elements) == full
+    assert len(full_listings()) == 1
+    assert elements_text("https://shop.test", elements) == unchanged
+    text = elements_text("https://shop.test", elements + [("footer/p", "<p>Cart: 1</p>")])
+    assert text.endswith("[Start of page]\n+ [20]<p>Cart: 1</p>\n[End of page]")
+
+    # an element at the top shifts every index, the diff would outgrow the listing
+    shifted = [("header/p", "<p>Cart: 1</p>")] + elements
+    assert elements_text("https://shop.test", shifted) == full
+    assert len(full_listings()) == 1
+    assert "[1]<a>Laptop 0</a>" in full_listings()[0]
+
+    # resent after dom_diff_resync_interval diffs
+    for _ in range(3):
+        assert elements_text("https://shop.test", shifted) == unchanged
+    assert elements_text("https://shop.test", shifted) == full
+
+    # and on a new url
+    assert elements_text("https://shop.test", shifted) == unchanged
+    assert elements_text("https://shop.test/cart", shifted) == full
+    assert len(full_listings()) == 1
+    assert full_listings()[0].startswith("Full listing of interactive elements of https://shop.test/cart")
+
+
+if __name__ == "__main__":
+    test_split_and_diff_element_entries()
+    test_dom_diff_resync()
@@ -0,0 +1,34 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_element_ranker():
+    from src.utils.element_ranking import ElementRanker
+
+    entries = {f"/html/body/div[{i}]": f"[{i}]<a>Product {i} details</a>" for i in range(50)}
+    entries["/html/body/form/input"] = "[50]<input placeholder='Search products' type='text'>"
+    entries["/html/body/button[1]"] = "[51]<button>Add to cart</button>"
+    entries["/html/body/button[2]"] = "[52]<button>Checkout</button>"
+
+    ranker = ElementRanker()
+    ranker.update(entries)
+    assert ranker.top("search for a laptop and add it to the cart", 2) == [
+        "/html/body/form/input", "/html/body/button[1]"]
+    # kept in page order, the rest is filled from the top of the page
+    assert ranker.top("checkout", 2) == ["/html/body/div[0]", "/html/body/button[2]"]
+
+    # incremental updates score like an index built from scratch
+    entries.pop("/html/body/div[3]")
+    entries["/html/body/button[2]"] = "[52]<button>Proceed to checkout</button>"
+    entries["/html/body/div[60]"] = "[60]<a>Laptop deals</a>"
+    ranker.update(entries)
+    fresh = ElementRanker()
+    fresh.update(entries)
+    query = "laptop checkout"
+    assert ranker.scores(query) == fresh.scores(query)
+    assert len(ranker) == len(entries)
+
+
+if __name__ == "__main__":
+    test_element_ranker()
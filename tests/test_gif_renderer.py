@@ -0,0 +1,38 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_gif_renderer(tmp_path):
+    import asyncio
+    import base64
+    import io
+    import os
+
+    from PIL import Image
+
+    from src.utils.gif_renderer import GifRenderer
+
+    def screenshot(color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1280, 1100), color).save(buffer, 'PNG')
+        return base64.b64encode(buffer.getvalue()).decode()
+
+    output_path = os.path.join(tmp_path, "agent_history.gif")
+    renderer = GifRenderer("Find the weather in Paris", output_path, frame_max_edge=640)
+    for i, color in enumerate(['red', 'green', 'blue']):
+        renderer.add_step(screenshot(color), f"Step goal {i}")
+    # steps without a screenshot are skipped
+    renderer.add_step(None, None)
+
+    assert asyncio.run(renderer.finish()) == output_path
+    gif = Image.open(output_path)
+    # task frame + one frame per screenshot, downscaled
+    assert gif.n_frames == 4
+    assert gif.size == (640, 550)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_gif_renderer(tempfile.mkdtemp())
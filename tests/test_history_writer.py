@@ -0,0 +1,78 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_history_writer(tmp_path):
+    import asyncio
+    import base64
+    import os
+    import shutil
+
+    from browser_use.agent.views import ActionResult, AgentHistory
+    from browser_use.browser.views import BrowserStateHistory
+    from browser_use.controller.service import Controller
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from src.agent.custom_views import CustomAgentOutput
+    from src.utils.history_writer import HistoryWriter, archive_run, load_conversations, load_history
+
+    action_model = Controller().registry.create_action_model()
+    output_model = CustomAgentOutput.type_with_custom_actions(action_model)
+    model_output = output_model.model_validate({
+        "current_state": {
+            "evaluation_previous_goal": "Unknown",
+            "important_contents": "",
+            "thought": "",
+            "next_goal": "Open the page",
+        },
+        "action": [{"go_to_url": {"url": "https://example.com"}}],
+    })
+    screenshot = base64.b64encode(os.urandom(30_000)).decode()
+    system_message = SystemMessage(content="You are a browser agent")
+
+    async def write_run():
+        writer = HistoryWriter(os.path.join(tmp_path, "run", "run.jsonl.gz"))
+        for step in range(1, 11):
+            state_message = HumanMessage(content=[
+                {"type": "text", "text": f"Step {step}"},
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{screenshot}"}},
+            ])
+            writer.write_conversation(step, [system_message, state_message], model_output)
+            writer.write_history_item(AgentHistory(
+                model_output=model_output,
+                result=[ActionResult(extracted_content=f"step {step}")],
+                state=BrowserStateHistory(url="https://example.com", title="", tabs=[], interacted_element=[None],
+                                          screenshot=screenshot),
+            ))
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(write_run())
+    # the same screenshot is stored once
+    assert len(os.listdir(writer.blob_dir)) == 1
+
+    history = load_history(writer.path, output_model)
+    assert len(history.history) == 10
+    assert history.history[-1].state.screenshot == screenshot
+    assert history.history[-1].result[0].extracted_content == "step 10"
+
+    conversations = list(load_conversations(writer.path))
+    step, messages, response = conversations[-1]
+    assert step == 10
+    assert messages[0].content == "You are a browser agent"
+    assert messages[1].content[1]["image_url"]["url"] == f"data:image/png;base64,{screenshot}"
+    assert response["current_state"]["next_goal"] == "Open the page"
+
+    # the archive of a run holds the stream and its blobs, which load back once extracted
+    archive = archive_run(os.path.join(tmp_path, "run"))
+    assert not os.path.exists(os.path.join(tmp_path, "run"))
+    shutil.unpack_archive(archive, os.path.join(tmp_path, "extracted"))
+    extracted = load_history(os.path.join(tmp_path, "extracted", "run.jsonl.gz"), output_model)
+    assert extracted.history[-1].state.screenshot == screenshot
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_history_writer(tempfile.mkdtemp())
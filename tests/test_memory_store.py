@@ -0,0 +1,25 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_memory_store():
+    from src.utils.memory_store import MemoryStore
+
+    store = MemoryStore()
+    assert store.add("Found 3 laptops under $500", 1)
+    assert not store.add("found 3 laptops under $500.", 2)
+    store.add("Opened the second search result page", 3)
+    store.add("Laptop A costs $450 and has 16GB RAM", 4)
+    assert len(store) == 3
+    assert store.render() == ("Found 3 laptops under $500\n"
+                              "Opened the second search result page\n"
+                              "Laptop A costs $450 and has 16GB RAM\n")
+
+    # within a small budget the entries relevant to the goal and the recent ones are kept
+    rendered = store.render(query="laptops under 500", max_tokens=20)
+    assert rendered == "Found 3 laptops under $500\nLaptop A costs $450 and has 16GB RAM\n"
+
+
+if __name__ == "__main__":
+    test_memory_store()
@@ -0,0 +1,56 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_custom_message_history_index():
+    from browser_use.agent.message_manager.views import MessageMetadata
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+    from src.agent.custom_views import CustomMessageHistory
+
+    history = CustomMessageHistory()
+
+    def check():
+        # the human message index follows the history, in order
+        humans = [m for m in history.messages if isinstance(m.message, HumanMessage)]
+        assert len(history._human_messages) == len(humans)
+        assert all(a is b for a, b in zip(history._human_messages, humans))
+        assert history.current_tokens == sum(m.metadata.tokens for m in history.messages)
+
+    history.add_message(SystemMessage(content="system"), MessageMetadata(tokens=1))
+    history.add_message(HumanMessage(content="task"), MessageMetadata(tokens=2))
+    for step in range(1, 5):
+        history.add_message(HumanMessage(content=f"state {step}"), MessageMetadata(tokens=10))
+        history.add_message(AIMessage(content=f"step {step}"), MessageMetadata(tokens=5))
+    check()
+
+    # inserted after the task, ahead of every state message
+    history.add_message(HumanMessage(content="example"), MessageMetadata(tokens=3), position=2)
+    check()
+    assert history._human_messages[1].message.content == "example"
+
+    # the system, task and example messages stay, the oldest steps go first
+    evicted = history.cut_after_prefix(3, max_tokens=40)
+    check()
+    assert [m.content for m in evicted] == ["state 1", "step 1", "state 2", "step 2"]
+    assert [m.message.content for m in history.messages][:4] == ["system", "task", "example", "state 3"]
+    assert history.current_tokens <= 40
+    assert history.cut_after_prefix(3, max_tokens=40) == []
+
+    history.remove_human_message(-1)
+    check()
+    assert [m.message.content for m in history._human_messages] == ["task", "example", "state 3"]
+
+    history.remove_human_message(1)
+    check()
+    assert [m.message.content for m in history.messages] == ["system", "task", "state 3", "step 3", "step 4"]
+
+    # out of range is a no-op
+    history.remove_human_message(5)
+    check()
+    assert len(history.messages) == 5
+
+
+if __name__ == "__main__":
+    test_custom_message_history_index()
@@ -0,0 +1,54 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_streaming_action_parser():
+    from src.utils.output_parser import StreamingActionParser
+
+    response = """```json
+{
+  "current_state": {
+    "evaluation_previous_goal": "Success - typed {query} into the box",
+    "important_contents": "",
+    "thought": "Use \\"search\\" then [click] the first result",
+    "next_goal": "Search"
+  },
+  "action": [
+    {"input_text": {"index": 3, "text": "open } brace ] bracket"}},
+    {"click_element": {"index": 5}},
+    {"done": {"text": "finished"}}
+  ]
+}
+```"""
+    parser = StreamingActionParser()
+    emitted = []
+    # feed the response in small chunks, like tokens arriving from the LLM
+    for i in range(0, len(response), 7):
+        emitted.append(parser.feed(response[i:i + 7]))
+
+    actions = [action for chunk in emitted for action in chunk]
+    assert actions == [
+        {"input_text": {"index": 3, "text": "open } brace ] bracket"}},
+        {"click_element": {"index": 5}},
+        {"done": {"text": "finished"}},
+    ]
+    # the first action is available long before the response is complete
+    first_chunk = next(i for i, chunk in enumerate(emitted) if chunk)
+    assert first_chunk < len(emitted) - 3
+
+
+def test_parse_model_json_tiers():
+    from src.utils.output_parser import parse_model_json, parse_tier_hits
+
+    parse_tier_hits.clear()
+    assert parse_model_json('{"action": [{"done": {"text": "ok"}}]}')["action"][0]["done"]["text"] == "ok"
+    assert parse_model_json('<think>plan {first}</think>\n```json\n{"a": 1}\n```')["a"] == 1
+    assert parse_model_json('Here you go: {"a": 2} hope it helps')["a"] == 2
+    assert parse_model_json('```json\n{"a": 3, "b": "unterminated}\n```')["a"] == 3
+    assert dict(parse_tier_hits) == {"strict": 1, "extracted": 2, "repaired": 1}
+
+
+if __name__ == "__main__":
+    test_streaming_action_parser()
+    test_parse_model_json_tiers()
@@ -0,0 +1,86 @@
+import sys
+
+sys.path.append(".")
+
+
+class _ApiError(Exception):
+    """Error shaped like the openai / anthropic ones, with the status code and response headers"""
+
+    def __init__(self, status_code, headers=None):
+        from types import SimpleNamespace
+
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_retry_delays():
+    from email.utils import formatdate
+    import time
+
+    from src.utils.retry_scheduler import RetryScheduler
+
+    scheduler = RetryScheduler(base_delay=1.0, max_delay=60.0)
+    # Retry-After in seconds, milliseconds or as a date, plus up to base_delay of jitter
+    assert 30 <= scheduler.get_delay(_ApiError(429, {"retry-after": "30"}), 0) <= 31
+    assert 1.5 <= scheduler.get_delay(_ApiError(429, {"retry-after-ms": "1500"}), 0) <= 2.5
+    assert 8 <= scheduler.get_delay(_ApiError(429, {"retry-after": formatdate(time.time() + 10, usegmt=True)}), 0) <= 11
+    assert scheduler.get_delay(_ApiError(429, {"retry-after": "600"}), 0) <= 61
+
+    # without Retry-After, rate limits back off from the old fixed retry delay
+    assert 10 <= scheduler.get_delay(_ApiError(429), 0) <= 11
+    assert 40 <= scheduler.get_delay(_ApiError(429), 2) <= 41
+    assert 60 <= scheduler.get_delay(_ApiError(429), 5) <= 61
+
+    # server and connection errors back off with full jitter, capped at max_delay
+    for attempt in range(8):
+        delay = scheduler.get_delay(_ApiError(503), attempt)
+        assert 0 <= delay <= min(60.0, 2 ** attempt)
+    assert scheduler.get_delay(ConnectionError(), 10) <= 60
+
+    # anything else is retried right away
+    assert scheduler.get_delay(ValueError("Could not parse response."), 3) == 0
+    assert scheduler.get_delay(_ApiError(400), 3) == 0
+
+
+def test_shared_throttle():
+    import asyncio
+    import time
+
+    from src.utils.retry_scheduler import RetryScheduler
+
+    scheduler = RetryScheduler(base_delay=0.01)
+
+    async def agents():
+        start = time.monotonic()
+        # one agent hits the rate limit, the other one waits for it to expire before its next request
+        limited = asyncio.create_task(scheduler.wait_before_retry(_ApiError(429, {"retry-after": "0.2"}), 0))
+        await asyncio.sleep(0)
+        await scheduler.wait_if_throttled()
+        assert time.monotonic() - start >= 0.2
+        await limited
+
+        # a rate limit reported while waiting extends the wait
+        start = time.monotonic()
+        scheduler._blocked_until = time.time() + 0.1
+
+        async def later_rate_limit():
+            await asyncio.sleep(0.05)
+            scheduler._blocked_until = time.time() + 0.2
+
+        extend = asyncio.create_task(later_rate_limit())
+        await scheduler.wait_if_throttled()
+        assert time.monotonic() - start >= 0.25
+        await extend
+
+        # nothing to wait for
+        start = time.monotonic()
+        await scheduler.wait_if_throttled()
+        assert time.monotonic() - start < 0.05
+
+    asyncio.run(agents())
+
+
+if __name__ == "__main__":
+    test_retry_delays()
+    test_shared_throttle()
@@ -0,0 +1,74 @@
+import sys
+
+sys.path.append(".")
+
+
+def _screenshot(color):
+    import base64
+    import io
+
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (1280, 720), color).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _manager(**settings):
+    from langchain_core.messages import SystemMessage
+
+    from src.agent.custom_message_manager import CustomMessageManager, CustomMessageManagerSettings
+    from src.agent.custom_views import CustomMessageManagerState
+
+    return CustomMessageManager(task="Open example.com", system_message=SystemMessage(content="system"),
+                                settings=CustomMessageManagerSettings(**settings), state=CustomMessageManagerState())
+
+
+def _state_message(screenshot):
+    from langchain_core.messages import HumanMessage
+
+    return HumanMessage(content=[{"type": "text", "text": "state"},
+                                 {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{screenshot}"}}])
+
+
+def test_dedupe_passes_screenshots_through():
+    manager = _manager(dedupe_screenshots=True)
+    white, black = _screenshot("white"), _screenshot("black")
+
+    first = manager._prepare_screenshot(_state_message(white))
+    # sent as it was taken, not re-encoded
+    assert first.content[1]["image_url"]["url"] == f"data:image/png;base64,{white}"
+    assert "omitted" in manager._prepare_screenshot(_state_message(white)).content[1]["text"]
+    assert manager._prepare_screenshot(_state_message(black)).content[1]["image_url"]["url"].endswith(black)
+
+
+def test_screenshot_prepared_off_the_event_loop():
+    import asyncio
+    import threading
+
+    import src.agent.custom_message_manager as custom_message_manager
+
+    manager = _manager(screenshot_max_edge=640, screenshot_format="jpeg")
+    threads = []
+    prepare_screenshot = custom_message_manager.prepare_screenshot
+
+    def record_thread(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return prepare_screenshot(*args, **kwargs)
+
+    async def add_message():
+        custom_message_manager.prepare_screenshot = record_thread
+        try:
+            manager._state_message = lambda *args: _state_message(_screenshot("white"))
+            await manager.add_state_message_async(None)
+        finally:
+            custom_message_manager.prepare_screenshot = prepare_screenshot
+
+    asyncio.run(add_message())
+    assert threads and threads[0] is not threading.main_thread()
+    assert manager.get_messages()[-1].content[1]["image_url"]["url"].startswith("data:image/jpeg;base64,")
+
+
+if __name__ == "__main__":
+    test_dedupe_passes_screenshots_through()
+    test_screenshot_prepared_off_the_event_loop()
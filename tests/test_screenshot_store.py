@@ -0,0 +1,38 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_spilled_browser_state_history(tmp_path):
+    import base64
+    import os
+
+    from browser_use.agent.views import ActionResult, AgentHistory, AgentHistoryList
+    from browser_use.browser.views import BrowserStateHistory
+
+    from src.utils.screenshot_store import ScreenshotStore, SpilledBrowserStateHistory
+
+    store = ScreenshotStore(tmp_path)
+    screenshot = base64.b64encode(os.urandom(30_000)).decode()
+    history = AgentHistoryList(history=[
+        AgentHistory(
+            model_output=None,
+            result=[ActionResult()],
+            state=SpilledBrowserStateHistory.spill(
+                BrowserStateHistory(url="https://example.com", title="", tabs=[], interacted_element=[None],
+                                    screenshot=screenshot), store),
+        )
+        for _ in range(3)
+    ])
+
+    # only the key is kept in memory, the same screenshot is stored once
+    assert "screenshot" not in vars(history.history[0].state)
+    assert len(os.listdir(tmp_path)) == 1
+    assert history.screenshots() == [screenshot] * 3
+    assert history.model_dump()["history"][0]["state"]["screenshot"] == screenshot
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_spilled_browser_state_history(tempfile.mkdtemp())
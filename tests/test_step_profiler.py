@@ -0,0 +1,87 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_step_profiler(tmp_path):
+    import asyncio
+    import json
+    import os
+
+    from browser_use.agent.views import ActionResult, AgentHistory, AgentHistoryList
+    from browser_use.browser.views import BrowserStateHistory
+    from browser_use.controller.service import Controller
+
+    from src.agent.custom_views import CustomAgentHistoryList, CustomAgentOutput, CustomStepMetadata
+    from src.utils.history_writer import HistoryWriter, load_history
+    from src.utils.step_profiler import StepProfiler, write_chrome_trace, write_timings_jsonl
+
+    profiler = StepProfiler()
+    with profiler.phase("llm"):
+        pass
+    try:
+        with profiler.phase("actions"):
+            raise RuntimeError("action failed")
+    except RuntimeError:
+        pass
+    # a phase is recorded even when it raises
+    assert [phase["name"] for phase in profiler.phases] == ["llm", "actions"]
+    assert all(phase["end_time"] >= phase["start_time"] for phase in profiler.phases)
+
+    output_model = CustomAgentOutput.type_with_custom_actions(Controller().registry.create_action_model())
+    history = AgentHistoryList(history=[
+        AgentHistory(
+            model_output=None,
+            result=[ActionResult(extracted_content=f"step {step}")],
+            state=BrowserStateHistory(url="https://example.com", title="", tabs=[], interacted_element=[None]),
+            metadata=CustomStepMetadata(step_number=step, step_start_time=100.0 * step,
+                                        step_end_time=100.0 * step + 3, input_tokens=1000,
+                                        phases=[{"name": "llm", "start_time": 100.0 * step,
+                                                 "end_time": 100.0 * step + 2},
+                                                {"name": "actions", "start_time": 100.0 * step + 2,
+                                                 "end_time": 100.0 * step + 2.5},
+                                                {"name": "actions", "start_time": 100.0 * step + 2.5,
+                                                 "end_time": 100.0 * step + 3}]),
+        )
+        for step in (1, 2)
+    ])
+
+    # the phases survive the json export and the history stream
+    json_path = os.path.join(tmp_path, "history.json")
+    history.save_to_file(json_path)
+    loaded = [CustomAgentHistoryList.load_from_file(json_path, output_model)]
+
+    async def write_stream():
+        writer = HistoryWriter(os.path.join(tmp_path, "run", "run.jsonl.gz"))
+        for item in history.history:
+            writer.write_history_item(item)
+        await writer.close()
+        return writer.path
+
+    loaded.append(load_history(asyncio.run(write_stream()), output_model))
+    for loaded_history in loaded:
+        assert [h.metadata.phases for h in loaded_history.history] == [h.metadata.phases for h in history.history]
+
+    timings_path = os.path.join(tmp_path, "timings", "timings.jsonl")
+    write_timings_jsonl(loaded[-1], timings_path)
+    with open(timings_path, encoding="utf-8") as f:
+        timings = [json.loads(line) for line in f]
+    assert [t["step"] for t in timings] == [1, 2]
+    assert timings[0]["duration"] == 3
+    assert timings[0]["input_tokens"] == 1000
+    # repeated phases of a step are added up
+    assert timings[0]["phases"] == {"llm": 2, "actions": 1}
+
+    trace_path = os.path.join(tmp_path, "trace.json")
+    write_chrome_trace(loaded[-1], trace_path)
+    with open(trace_path, encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+    assert [e["name"] for e in events] == ["step 1", "llm", "actions", "actions", "step 2", "llm", "actions", "actions"]
+    assert events[1]["ts"] == 100 * 1e6
+    assert events[1]["dur"] == 2 * 1e6
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_step_profiler(tempfile.mkdtemp())
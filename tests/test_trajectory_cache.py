@@ -0,0 +1,153 @@
+import sys
+
+sys.path.append(".")
+
+
+def test_trajectory_cache(tmp_path):
+    from browser_use.agent.views import ActionResult, AgentHistory, AgentHistoryList
+    from browser_use.browser.views import BrowserStateHistory
+    from browser_use.controller.service import Controller
+
+    from src.agent.custom_views import CustomAgentOutput
+    from src.utils.trajectory_cache import TrajectoryCache
+
+    action_model = Controller().registry.create_action_model()
+    output_model = CustomAgentOutput.type_with_custom_actions(action_model)
+    model_output = output_model.model_validate({
+        "current_state": {
+            "evaluation_previous_goal": "Unknown",
+            "important_contents": "",
+            "thought": "",
+            "next_goal": "Open the page",
+        },
+        "action": [{"go_to_url": {"url": "https://example.com"}}, {"done": {"text": "ok", "success": True}}],
+    })
+    history = AgentHistoryList(history=[
+        AgentHistory(
+            model_output=model_output,
+            result=[ActionResult(), ActionResult(is_done=True, success=True, extracted_content="ok")],
+            state=BrowserStateHistory(url="about:blank", title="", tabs=[], interacted_element=[None, None],
+                                      screenshot="iVBORw0KGgo="),
+        )
+    ])
+
+    cache = TrajectoryCache(str(tmp_path))
+    cache.put("Open  Example.com ", "https://Example.com/#top", history)
+    cached = cache.get("open example.com", "https://example.com/", output_model)
+    assert cached is not None
+    assert cached.history[0].state.screenshot is None
+    assert cached.history[0].model_output.action[0].model_dump(exclude_none=True) == {
+        "go_to_url": {"url": "https://example.com"}}
+    assert cache.get("open example.org", "https://example.com/", output_model) is None
+
+
+def _note_taker(notes, failing=()):
+    """Agent settings with a page that never changes and a note action, which fails for the texts in failing"""
+    from types import SimpleNamespace
+
+    from browser_use.agent.views import ActionResult
+    from browser_use.browser.views import BrowserState
+    from browser_use.controller.service import Controller
+    from browser_use.dom.views import DOMElementNode
+
+    from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+
+    controller = Controller()
+
+    @controller.registry.action("Write down a note")
+    async def note(text: str):
+        if text in failing:
+            return ActionResult(error=f"could not note {text}")
+        notes.append(text)
+        return ActionResult(extracted_content=f"noted {text}")
+
+    async def get_state():
+        return BrowserState(
+            element_tree=DOMElementNode(is_visible=True, parent=None, tag_name="body", xpath="body", attributes={},
+                                        children=[]),
+            selector_map={},
+            url="https://example.com",
+            title="Example",
+            tabs=[],
+        )
+
+    async def get_current_page():
+        return SimpleNamespace(url="https://example.com")
+
+    async def get_selector_map():
+        return {}
+
+    async def remove_highlights():
+        pass
+
+    browser_context = SimpleNamespace(get_state=get_state, get_current_page=get_current_page,
+                                      get_selector_map=get_selector_map, remove_highlights=remove_highlights,
+                                      config=SimpleNamespace(wait_between_actions=0))
+    return dict(task="Take notes", controller=controller, browser_context=browser_context,
+                system_prompt_class=CustomSystemPrompt, agent_prompt_class=CustomAgentMessagePrompt)
+
+
+def _llm(*actions):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    return FakeListChatModel(responses=[
+        '{"current_state": {"evaluation_previous_goal": "Success", "important_contents": "%s", "thought": "", '
+        '"next_goal": "goal %d"}, "action": [%s]}' % (f"remember {i}", i, action)
+        for i, action in enumerate(actions, 1)
+    ])
+
+
+def test_trajectory_replay(tmp_path):
+    import asyncio
+
+    from src.agent.custom_agent import CustomAgent
+
+    steps = ['{"note": {"text": "a"}}', '{"note": {"text": "b"}}', '{"done": {"text": "ok", "success": true}}']
+    notes = []
+    agent = CustomAgent(llm=_llm(*steps), trajectory_cache_dir=str(tmp_path), **_note_taker(notes))
+    asyncio.run(agent.run(max_steps=5))
+    assert notes == ["a", "b"] and agent.state.history.is_done()
+
+    # replayed without the LLM
+    notes.clear()
+    agent = CustomAgent(llm=_llm(), trajectory_cache_dir=str(tmp_path), **_note_taker(notes))
+    asyncio.run(agent.run(max_steps=5))
+    assert notes == ["a", "b"] and agent.state.history.is_done()
+
+    # the page diverges at the second step, the LLM continues with the context of the replayed step
+    notes.clear()
+    agent = CustomAgent(llm=_llm('{"done": {"text": "ok", "success": true}}'), trajectory_cache_dir=str(tmp_path),
+                        **_note_taker(notes, failing=("b",)))
+    inputs = []
+    get_next_action = agent.get_next_action
+
+    async def record_input(input_messages):
+        inputs.append(input_messages)
+        return await get_next_action(input_messages)
+
+    agent.get_next_action = record_input
+    asyncio.run(agent.run(max_steps=5))
+    assert notes == ["a"] and agent.state.history.is_done()
+    assert '"text":"a"' in inputs[0][-3].content
+    assert "remember 1" in str(inputs[0][-1].content) and "could not note b" in str(inputs[0][-1].content)
+
+    # a stop during the replay ends the run
+    notes.clear()
+    agent = CustomAgent(llm=_llm(), trajectory_cache_dir=str(tmp_path), **_note_taker(notes))
+    note = agent.controller.registry.registry.actions["note"]
+    note_function = note.function
+
+    async def note_and_stop(*args, **kwargs):
+        agent.stop()
+        return await note_function(*args, **kwargs)
+
+    note.function = note_and_stop
+    history = asyncio.run(agent.run(max_steps=5))
+    assert notes == ["a"] and not history.is_done()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_trajectory_cache(tempfile.mkdtemp())
+    test_trajectory_replay(tempfile.mkdtemp())
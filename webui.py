@@ -29,11 +29,13 @@ from src.utils.agent_state import AgentState
 
 from src.utils import utils
 from src.agent.custom_agent import CustomAgent
+from src.agent.custom_views import CustomAgentState
 from src.browser.custom_browser import CustomBrowser
 from src.agent.custom_prompts import CustomSystemPrompt, CustomAgentMessagePrompt
 from src.browser.custom_context import BrowserContextConfig, CustomBrowserContext
 from src.controller.custom_controller import CustomController
 from gradio.themes import Citrus, Default, Glass, Monochrome, Ocean, Origin, Soft, Base
+from src.utils.history_writer import archive_run
 from src.utils.utils import update_model_dropdown, get_latest_files, capture_screenshot, MissingAPIKeyError
 from src.utils import utils
 
@@ -41,6 +43,8 @@ from src.utils import utils
 _global_browser = None
 _global_browser_context = None
 _global_agent = None
+# GIF of the last custom agent run, rendered in the background after it returns
+_global_gif_task = None
 
 # Create the global agent state instance
 _global_agent_state = AgentState()
@@ -116,12 +120,14 @@ def resolve_sensitive_env_variables(text):
 
 async def stop_agent():
     """Request the agent to stop and update UI with enhanced feedback"""
-    global _global_agent
+    global _global_agent, _global_agent_state
 
     try:
         if _global_agent is not None:
             # Request stop
             _global_agent.stop()
+        # Also cancels an in-flight LLM call of the custom agent
+        _global_agent_state.request_stop()
         # Update UI immediately
         message = "Stop requested - the agent will halt at the next safe point"
         logger.info(f"🛑 {message}")
@@ -166,6 +172,20 @@ async def stop_research_agent():
         )
 
 
+async def wait_for_history_gif():
+    """Wait for the GIF of the last custom agent run, returns its path or None"""
+    global _global_gif_task
+    if _global_gif_task is None:
+        return None
+    try:
+        return await _global_gif_task
+    except Exception as e:
+        logger.warning(f"Failed to create history GIF: {e}")
+        return None
+    finally:
+        _global_gif_task = None
+
+
 async def run_browser_agent(
         agent_type,
         llm_provider,
@@ -191,8 +211,11 @@ async def run_browser_agent(
         max_actions_per_step,
         tool_calling_method,
         chrome_cdp,
-        max_input_tokens
+        max_input_tokens,
+        stream_history=False
 ):
+    global _global_gif_task
+    _global_gif_task = None
     try:
         # Disable recording if the checkbox is unchecked
         if not enable_recording:
@@ -260,7 +283,8 @@ async def run_browser_agent(
                 max_actions_per_step=max_actions_per_step,
                 tool_calling_method=tool_calling_method,
                 chrome_cdp=chrome_cdp,
-                max_input_tokens=max_input_tokens
+                max_input_tokens=max_input_tokens,
+                stream_history=stream_history
             )
         else:
             raise ValueError(f"Invalid agent type: {agent_type}")
@@ -276,6 +300,9 @@ async def run_browser_agent(
         #         latest_video = list(new_videos - existing_videos)[0]  # Get the first new video
 
         gif_path = os.path.join(os.path.dirname(__file__), "agent_history.gif")
+        if _global_gif_task is not None:
+            # still rendering, run_with_stream sends it in a follow-up update
+            gif_path = None
 
         return (
             final_result,
@@ -431,10 +458,14 @@ async def run_custom_agent(
         max_actions_per_step,
         tool_calling_method,
         chrome_cdp,
-        max_input_tokens
+        max_input_tokens,
+        stream_history=False
 ):
     try:
-        global _global_browser, _global_browser_context, _global_agent
+        global _global_browser, _global_browser_context, _global_agent, _global_agent_state, _global_gif_task
+
+        # Clear any previous stop request
+        _global_agent_state.clear_stop()
 
         extra_chromium_args = ["--accept_downloads=True", f"--window-size={window_w},{window_h}"]
         cdp_url = chrome_cdp
@@ -478,7 +509,9 @@ async def run_custom_agent(
                 )
             )
 
-        # Create and run agent
+        # Create and run agent, a streamed run gets its own folder which is archived and removed at the end
+        agent_run_state = CustomAgentState()
+        run_dir = os.path.join(save_agent_history_path, agent_run_state.agent_id) if stream_history else None
         if _global_agent is None:
             _global_agent = CustomAgent(
                 task=task,
@@ -493,12 +526,21 @@ async def run_custom_agent(
                 max_actions_per_step=max_actions_per_step,
                 tool_calling_method=tool_calling_method,
                 max_input_tokens=max_input_tokens,
-                generate_gif=True
+                generate_gif=True,
+                agent_state=_global_agent_state,
+                injected_agent_state=agent_run_state,
+                history_stream_dir=run_dir,
+                screenshot_store_dir=os.path.join(run_dir, "blobs") if run_dir else None
             )
         history = await _global_agent.run(max_steps=max_steps)
+        _global_gif_task = _global_agent.gif_task
 
-        history_file = os.path.join(save_agent_history_path, f"{_global_agent.state.agent_id}.json")
-        _global_agent.save_history(history_file)
+        if run_dir:
+            # the GIF frames are already rendered, the screenshots are only needed in the archive
+            history_file = await asyncio.to_thread(archive_run, run_dir)
+        else:
+            history_file = os.path.join(save_agent_history_path, f"{_global_agent.state.agent_id}.json")
+            await asyncio.to_thread(_global_agent.save_history, history_file)
 
         final_result = history.final_result()
         errors = history.errors()
@@ -551,7 +593,8 @@ async def run_with_stream(
         max_actions_per_step,
         tool_calling_method,
         chrome_cdp,
-        max_input_tokens
+        max_input_tokens,
+        stream_history=False
 ):
     global _global_agent
 
@@ -583,10 +626,16 @@ async def run_with_stream(
             max_actions_per_step=max_actions_per_step,
             tool_calling_method=tool_calling_method,
             chrome_cdp=chrome_cdp,
-            max_input_tokens=max_input_tokens
+            max_input_tokens=max_input_tokens,
+            stream_history=stream_history
         )
         # Add HTML content at the start of the result array
-        yield [gr.update(visible=False)] + list(result)
+        result = [gr.update(visible=False)] + list(result)
+        yield result
+        gif_path = await wait_for_history_gif()
+        if gif_path:
+            result[5] = gif_path
+            yield result
     else:
         try:
             # Run the browser agent in the background
@@ -616,7 +665,8 @@ async def run_with_stream(
                     max_actions_per_step=max_actions_per_step,
                     tool_calling_method=tool_calling_method,
                     chrome_cdp=chrome_cdp,
-                    max_input_tokens=max_input_tokens
+                    max_input_tokens=max_input_tokens,
+                    stream_history=stream_history
                 )
             )
 
@@ -691,6 +741,21 @@ async def run_with_stream(
                 run_button
             ]
 
+            recording_gif = await wait_for_history_gif()
+            if recording_gif:
+                yield [
+                    gr.HTML(value=html_content, visible=True),
+                    final_result,
+                    errors,
+                    model_actions,
+                    model_thoughts,
+                    recording_gif,
+                    trace,
+                    history_file,
+                    stop_button,
+                    run_button
+                ]
+
         except Exception as e:
             import traceback
             yield [
@@ -987,6 +1052,14 @@ def create_ui(theme_name="Ocean"):
                         interactive=True,
                     )
 
+                    stream_history = gr.Checkbox(
+                        label="Stream Agent History",
+                        value=False,
+                        info="Write steps and screenshots to disk while the agent runs instead of keeping them in "
+                             "memory, for long runs. The history download is then a zip of the run.",
+                        interactive=True,
+                    )
+
             with gr.TabItem("🤖 Run Agent", id=4):
                 task = gr.Textbox(
                     label="Task Description",
@@ -1072,7 +1145,7 @@ def create_ui(theme_name="Ocean"):
                     use_own_browser, keep_browser_open, headless, disable_security, window_w, window_h,
                     save_recording_path, save_agent_history_path, save_trace_path,  # Include the new path
                     enable_recording, task, add_infos, max_steps, use_vision, max_actions_per_step,
-                    tool_calling_method, chrome_cdp, max_input_tokens
+                    tool_calling_method, chrome_cdp, max_input_tokens, stream_history
                 ],
                 outputs=[
                     browser_view,  # Browser view